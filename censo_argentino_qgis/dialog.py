@@ -1,22 +1,36 @@
 import os
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
 from qgis.core import Qgis, QgsMessageLog, QgsProject, QgsVectorLayer
 from qgis.PyQt import QtWidgets, uic
-from qgis.PyQt.QtCore import QCoreApplication, Qt, QThread, QTimer, pyqtSignal
+from qgis.PyQt.QtCore import (
+    QCoreApplication,
+    QObject,
+    QRunnable,
+    Qt,
+    QThreadPool,
+    QTimer,
+    pyqtSignal,
+)
 from qgis.PyQt.QtGui import QFont, QIcon
 from qgis.utils import iface
 
 from .config import AVAILABLE_YEARS
 from .query import (
+    _connection_pool,
     calculate_column_count,
     get_geographic_codes,
+    get_initial_data,
     get_variable_categories,
     get_variables,
     load_census_layer,
+    memoized_lookup,
     preload_all_metadata,
     run_custom_query,
 )
+from .search_index import build_trigram_index, search_trigram_index
 
 FORM_CLASS, _ = uic.loadUiType(os.path.join(os.path.dirname(__file__), "dialog.ui"))
 
@@ -82,14 +96,38 @@ ORDER BY poblacion_total DESC""",
 }
 
 
-class DataLoaderThread(QThread):
-    """Thread for loading data asynchronously"""
+@contextmanager
+def bulk_list_update(list_widget):
+    """Suspender repintado y señales de un QListWidget mientras se llena en bloque"""
+    list_widget.setUpdatesEnabled(False)
+    list_widget.blockSignals(True)
+    try:
+        yield list_widget
+    finally:
+        list_widget.blockSignals(False)
+        list_widget.setUpdatesEnabled(True)
+
+
+MAX_LOADER_THREADS = 2  # Cargas en segundo plano simultáneas del diálogo
+SHUTDOWN_WAIT_MS = 5000  # Espera máxima por los hilos del pool al descargar el plugin
+PROGRESS_EVENTS_INTERVAL = 0.033  # Segundos entre processEvents() (~30 Hz)
+
+
+class DataLoaderSignals(QObject):
+    """Signals for DataLoaderRunnable (QRunnable is not a QObject)"""
 
     finished = pyqtSignal(object, str)  # (result, data_type)
     error = pyqtSignal(str, str)  # (error_message, data_type)
+    progress = pyqtSignal(int, str)  # (percent, message)
+
+
+class DataLoaderRunnable(QRunnable):
+    """Task for loading data asynchronously on the dialog's thread pool"""
 
     def __init__(self, load_func, data_type, *args, **kwargs):
         super().__init__()
+        self.signals = DataLoaderSignals()
+        self.cancelled = False  # Reemplazada por una carga más nueva del mismo tipo
         self.load_func = load_func
         self.data_type = data_type
         self.args = args
@@ -98,9 +136,32 @@ class DataLoaderThread(QThread):
     def run(self):
         try:
             result = self.load_func(*self.args, **self.kwargs)
-            self.finished.emit(result, self.data_type)
+            if self.cancelled:
+                return
+            self.signals.finished.emit(result, self.data_type)
         except Exception as e:
-            self.error.emit(str(e), self.data_type)
+            if not self.cancelled:
+                self.signals.error.emit(str(e), self.data_type)
+
+
+class LayerLoaderRunnable(DataLoaderRunnable):
+    """Carga de una capa en segundo plano con progreso por señal.
+
+    La capa se crea en un hilo del pool; antes de entregarla se mueve al hilo
+    principal para que pueda agregarse al proyecto.
+    """
+
+    def __init__(self, load_func, data_type, **kwargs):
+        super().__init__(self.load_layer, data_type, **kwargs)
+        self.layer_func = load_func
+        self.kwargs["progress_callback"] = self.signals.progress.emit
+        # La consulta revisa la bandera entre lotes y abandona la carga si se canceló
+        self.kwargs["is_cancelled"] = lambda: self.cancelled
+
+    def load_layer(self, **kwargs):
+        layer = self.layer_func(**kwargs)
+        layer.moveToThread(QCoreApplication.instance().thread())
+        return layer
 
 
 class CensoArgentinoDialog(QtWidgets.QDialog, FORM_CLASS):
@@ -110,18 +171,36 @@ class CensoArgentinoDialog(QtWidgets.QDialog, FORM_CLASS):
 
         self.variables = {}  # Store mapping of variable codes to labels
         self.entity_types = []  # Store entity types
-        self.loader_threads = []  # Track active threads
+        # Pool propio y acotado (el global de QGIS se usa para renderizar)
+        self.loader_pool = QThreadPool(self)
+        self.loader_pool.setMaxThreadCount(MAX_LOADER_THREADS)
+        self.active_loaders = {}  # data_type -> carga vigente (las anteriores se ignoran)
+        self.layer_loader = None  # Carga de capa en curso (btnLoad deshabilitado mientras tanto)
+        self._loading_variable_count = 0
+        self._transforms = {}  # CRS del mapa -> QgsCoordinateTransform a EPSG:4326
+        self._last_events_time = 0.0  # time.monotonic() del último processEvents()
         self.last_query = ""  # Store last executed query for copying
         self.last_browse_query = ""  # Store last Browse tab query for error logging
         self.variable_categories = {}  # Store categories for each selected variable
         self.category_widgets = {}  # Store category UI widgets per variable
+        self._variable_search_texts = []  # Texto en minúsculas por fila de listVariables
+        self._variable_trigrams = {}  # Índice de trigramas sobre _variable_search_texts
+        self._hidden_variable_rows = set()  # Filas de listVariables ocultas por la búsqueda
+        self._checked_variables = {}  # Códigos marcados en listVariables (dict como set ordenado)
+        self._geo_state = {}  # geo_level -> [(código, etiqueta, marcado), ...] ya cargados
+        self._geo_filter_level = None  # Nivel de los códigos mostrados en listGeoFilter
+        self._requested_geo_level = None  # Nivel de la carga de códigos en curso
 
         # Search debounce timer
-        self.search_timer = QTimer()
+        self.search_timer = QTimer(self)
         self.search_timer.setSingleShot(True)
-        self.search_timer.setInterval(200)  # 200ms debounce
+        self.search_timer.setInterval(150)  # 150ms debounce
         self.search_timer.timeout.connect(self.perform_search)
 
+        # Todas las filas tienen la misma altura: la vista no mide ítem por ítem
+        self.listVariables.setUniformItemSizes(True)
+        self.listGeoFilter.setUniformItemSizes(True)
+
         # Initialize UI
         self.progressBar.hide()
         self.lblStatus.hide()
@@ -131,14 +210,18 @@ class CensoArgentinoDialog(QtWidgets.QDialog, FORM_CLASS):
 
         # Initialize category section (collapsed by default)
         self.groupBoxCategories.setChecked(False)
+        # Filtro geográfico desactivado: los códigos se cargan al activarlo
+        self.groupBoxGeoFilter.setChecked(False)
 
         # Initialize Browse tab
         self.init_year_combo()
         self.init_geo_level_combo()
         self.init_entity_type_combo()
+        self._prev_geo_level = self.comboGeoLevel.currentData()
         self.comboYear.currentIndexChanged.connect(self.on_year_changed)
         self.comboGeoLevel.currentIndexChanged.connect(self.on_geo_level_changed)
         self.comboEntityType.currentIndexChanged.connect(self.on_entity_type_changed)
+        self.groupBoxGeoFilter.toggled.connect(self.on_geo_filter_toggled)
         self.listVariables.itemChanged.connect(self.on_variable_changed)
         self.searchVariables.textChanged.connect(self.on_search_changed)
         self.btnSelectAllVars.clicked.connect(self.on_select_all_vars_clicked)
@@ -201,98 +284,221 @@ class CensoArgentinoDialog(QtWidgets.QDialog, FORM_CLASS):
             self.last_browse_query = message[len("QUERY_TEXT:") :]
             return  # Don't show this as a status message
 
+        # Llega por señal encolada desde el pool: el bucle de eventos ya está libre,
+        # processEvents() aquí solo anidaría otras señales (ej. on_layer_loaded)
         self.progressBar.setValue(percent)
         self.lblStatus.setText(message)
-        QCoreApplication.processEvents()
+
+    def process_events_throttled(self, percent):
+        """Procesar eventos de Qt a lo sumo ~30 veces por segundo (siempre al 100%)"""
+        now = time.monotonic()
+        if percent >= 100 or now - self._last_events_time >= PROGRESS_EVENTS_INTERVAL:
+            self._last_events_time = now
+            QCoreApplication.processEvents()
 
     def load_data_async(self):
-        """Load initial data (geo codes, variables, and metadata) in background threads"""
+        """Load initial data (metadata and variables, geo codes if enabled) in background"""
         year = self.comboYear.currentData() or "2022"
         self.lblDescription.setText("Cargando datos...")
 
-        # Preload all metadata in background (makes category lookups instant)
-        metadata_thread = DataLoaderThread(preload_all_metadata, "metadata", year=year)
-        metadata_thread.finished.connect(self.on_metadata_loaded)
-        metadata_thread.error.connect(self.on_data_load_error)
-        self.loader_threads.append(metadata_thread)
-        metadata_thread.start()
-
-        # Load geographic codes in background
-        geo_level = self.comboGeoLevel.currentData()
-        if geo_level:
-            geo_thread = DataLoaderThread(
-                get_geographic_codes, "geo_codes", year=year, geo_level=geo_level
-            )
-            geo_thread.finished.connect(self.on_geo_codes_loaded)
-            geo_thread.error.connect(self.on_data_load_error)
-            self.loader_threads.append(geo_thread)
-            geo_thread.start()
+        # Geographic codes load lazily, only once the geo filter is enabled
+        if self.groupBoxGeoFilter.isChecked():
+            self.load_geo_codes()
 
-        # Load variables in background
         entity_type = self.comboEntityType.currentData()
-        if entity_type:
-            var_thread = DataLoaderThread(
-                get_variables, "variables", year=year, entity_type=entity_type
-            )
-            var_thread.finished.connect(self.on_variables_loaded)
-            var_thread.error.connect(self.on_data_load_error)
-            self.loader_threads.append(var_thread)
-            var_thread.start()
+        if not entity_type:
+            # Preload all metadata in background (makes category lookups instant)
+            self.start_loader(preload_all_metadata, "metadata", self.on_metadata_loaded, year=year)
+            return
+
+        # Metadatos y variables en un solo hilo; una carga de variables anterior
+        # (otro año o tipo de entidad) queda reemplazada
+        self.cancel_loader("variables")
+        self.start_loader(
+            get_initial_data,
+            "initial",
+            self.on_initial_data_loaded,
+            year=year,
+            memo_arg=entity_type,
+            entity_type=entity_type,
+        )
+
+    def start_loader(self, load_func, data_type, on_loaded, year, memo_arg=None, **kwargs):
+        """Ejecutar load_func en segundo plano, o en el acto si ya está memorizado.
+
+        Cuando el resultado ya se consultó en esta sesión (ej. volver a un tipo de
+        entidad anterior) se entrega directamente a on_loaded sin usar el pool.
+        memo_arg (entity_type o geo_level, None para metadatos) forma con year la
+        clave de memoización; kwargs se pasan tal cual a load_func.
+        """
+        self.cancel_loader(data_type)
+
+        memoized = memoized_lookup(load_func, year, memo_arg)
+        if memoized is not None:
+            on_loaded(memoized, data_type)
+            return
+
+        loader = DataLoaderRunnable(load_func, data_type, year=year, **kwargs)
+        loader.signals.finished.connect(on_loaded)
+        loader.signals.error.connect(self.on_data_load_error)
+        self.active_loaders[data_type] = loader
+        self.loader_pool.start(loader)
+
+    def cancel_loader(self, data_type):
+        """Descartar la carga en curso de data_type para que su resultado no llegue a la UI.
+
+        Se usa cuando una carga nueva la reemplaza (ej. cambios rápidos de tipo de
+        entidad). Si la tarea ya está corriendo termina sola y no emite nada.
+        """
+        previous = self.active_loaders.pop(data_type, None)
+        if previous is not None:
+            previous.cancelled = True
+            previous.signals.finished.disconnect()
+            previous.signals.error.disconnect()
+
+    def shutdown_loaders(self):
+        """Cancelar todas las cargas y esperar a que terminen los hilos del pool.
+
+        Se llama al descargar el plugin, antes de cerrar la conexión DuckDB compartida:
+        las tareas en cola se descartan, las consultas en curso se interrumpen y
+        ninguna señal llega a un diálogo que está por destruirse. La espera está
+        acotada para no bloquear QGIS si un hilo tarda en notar la cancelación.
+        """
+        for data_type in list(self.active_loaders):
+            self.cancel_loader(data_type)
+
+        if self.layer_loader is not None:
+            self.layer_loader.cancelled = True
+            self.layer_loader.signals.progress.disconnect()
+            self.layer_loader.signals.finished.disconnect()
+            self.layer_loader.signals.error.disconnect()
+            self.layer_loader = None
+
+        self.loader_pool.clear()
+        _connection_pool.interrupt()
+        self.loader_pool.waitForDone(SHUTDOWN_WAIT_MS)
+
+    def is_stale_result(self, data_type):
+        """True si la señal viene de una carga ya reemplazada para data_type"""
+        sender = self.sender()
+        if not isinstance(sender, DataLoaderSignals):
+            return False
+        loader = self.active_loaders.get(data_type)
+        return loader is None or loader.signals is not sender
 
     def on_metadata_loaded(self, metadata_map, data_type):
         """Handle metadata preload completion"""
+        if self.is_stale_result(data_type):
+            return
+        self.log_metadata_loaded(metadata_map)
+        self.check_loading_complete(data_type)
+
+    def log_metadata_loaded(self, metadata_map):
+        """Registrar la precarga de metadatos"""
         # Metadata is now cached - all category lookups will be instant
         QgsMessageLog.logMessage(
             f"Metadata precargados: {len(metadata_map)} variables con categorías",
             "Censo Argentino",
             Qgis.Info,
         )
-        self.check_loading_complete()
+
+    def on_initial_data_loaded(self, result, data_type):
+        """Recibir metadatos y variables cargados juntos por get_initial_data"""
+        if self.is_stale_result(data_type):
+            return
+        metadata_map, variables = result
+        self.log_metadata_loaded(metadata_map)
+        self.populate_variables(variables)
+        self.check_loading_complete(data_type)
 
     def on_geo_codes_loaded(self, geo_codes, data_type):
         """Handle geographic codes loaded in background"""
-        self.listGeoFilter.clear()
-        for code, label in geo_codes:
-            item = QtWidgets.QListWidgetItem(label)
-            item.setData(Qt.UserRole, code)
-            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
-            item.setCheckState(Qt.Unchecked)
-            self.listGeoFilter.addItem(item)
-        self.check_loading_complete()
+        if self.is_stale_result(data_type):
+            return
+        self.populate_geo_filter(
+            ((code, label, False) for code, label in geo_codes), self._requested_geo_level
+        )
+        self.check_loading_complete(data_type)
+
+    def populate_geo_filter(self, entries, geo_level):
+        """Llenar listGeoFilter con códigos de geo_level (tuplas código, etiqueta, marcado)"""
+        self._geo_filter_level = geo_level
+        with bulk_list_update(self.listGeoFilter):
+            self.listGeoFilter.clear()
+            for code, label, checked in entries:
+                item = QtWidgets.QListWidgetItem(label)
+                item.setData(Qt.UserRole, code)
+                item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+                item.setCheckState(Qt.Checked if checked else Qt.Unchecked)
+                self.listGeoFilter.addItem(item)
+
+    def save_geo_filter_state(self, geo_level):
+        """Guardar códigos y selección de listGeoFilter para reusarlos al volver al nivel"""
+        # Solo si la lista es de ese nivel (no una vacía o a medio cargar de otro)
+        if not geo_level or geo_level != self._geo_filter_level:
+            return
+        entries = []
+        for i in range(self.listGeoFilter.count()):
+            item = self.listGeoFilter.item(i)
+            entries.append((item.data(Qt.UserRole), item.text(), item.checkState() == Qt.Checked))
+        self._geo_state[geo_level] = entries
 
     def on_variables_loaded(self, variables, data_type):
         """Handle variables loaded in background"""
-        self.listVariables.clear()
+        if self.is_stale_result(data_type):
+            return
+        self.populate_variables(variables)
+        self.check_loading_complete(data_type)
+
+    def populate_variables(self, variables):
+        """Llenar listVariables desde tuplas (código, etiqueta) y reconstruir su índice"""
+        self.clear_variable_list()
         self.variables = {}
-        for code, label in variables:
-            item = QtWidgets.QListWidgetItem(f"{label} ({code})")
-            item.setData(Qt.UserRole, code)
-            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
-            item.setCheckState(Qt.Unchecked)
-            self.listVariables.addItem(item)
-            self.variables[code] = label
-        self.check_loading_complete()
+        search_texts = []
+        with bulk_list_update(self.listVariables):
+            for code, label in variables:
+                item_text = f"{label} ({code})"
+                item = QtWidgets.QListWidgetItem(item_text)
+                item.setData(Qt.UserRole, code)
+                item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+                item.setCheckState(Qt.Unchecked)
+                self.listVariables.addItem(item)
+                self.variables[code] = label
+                search_texts.append(item_text.lower())
+
+        # Índice de búsqueda alineado con las filas de listVariables
+        self._variable_search_texts = search_texts
+        self._variable_trigrams = build_trigram_index(search_texts)
+
+    def clear_variable_list(self):
+        """Vaciar listVariables junto con su índice de búsqueda y filas ocultas"""
+        self.listVariables.clear()
+        self._variable_search_texts = []
+        self._variable_trigrams = {}
+        self._hidden_variable_rows = set()
+        self._checked_variables = {}
 
     def on_data_load_error(self, error_message, data_type):
         """Handle errors during background data loading"""
+        if self.is_stale_result(data_type):
+            return
         QgsMessageLog.logMessage(
             f"Error loading {data_type}: {error_message}", "Censo Argentino", Qgis.Warning
         )
-        self.check_loading_complete()
+        self.check_loading_complete(data_type)
 
-    def check_loading_complete(self):
-        """Check if all loading threads are complete"""
-        all_complete = all(not thread.isRunning() for thread in self.loader_threads)
-        if all_complete:
+    def check_loading_complete(self, data_type=None):
+        """Marcar data_type como entregado y limpiar el estado si no queda nada vigente"""
+        self.active_loaders.pop(data_type, None)
+        if not self.active_loaders:
             self.lblDescription.setText("")
-            # Clean up finished threads
-            self.loader_threads = [t for t in self.loader_threads if t.isRunning()]
 
     def on_year_changed(self):
         """Load entity types and variables when year changes"""
-        # Clear current data
-        self.listVariables.clear()
-        self.listGeoFilter.clear()
+        # Clear current data (los códigos geográficos cambian con el año)
+        self.clear_variable_list()
+        self.clear_geo_filter()
+        self._geo_state = {}
         self.clear_all_category_widgets()
 
         # Reload all data for the new year
@@ -305,27 +511,60 @@ class CensoArgentinoDialog(QtWidgets.QDialog, FORM_CLASS):
 
     def on_geo_level_changed(self):
         """Load geographic codes when level changes (async)"""
+        self.save_geo_filter_state(self._prev_geo_level)
+        self.clear_geo_filter()
+        self._prev_geo_level = self.comboGeoLevel.currentData()
+
+        if self.groupBoxGeoFilter.isChecked():
+            self.load_geo_codes()
+
+    def clear_geo_filter(self):
+        """Vaciar listGeoFilter y descartar la carga de códigos en curso.
+
+        Se cancela aunque el filtro esté desactivado: una carga del nivel o año
+        anterior no debe llenar la lista cuando se vuelva a activar.
+        """
+        self.cancel_loader("geo_codes")
         self.listGeoFilter.clear()
+        self._geo_filter_level = None
+
+    def on_geo_filter_toggled(self, checked):
+        """Al activar el filtro, cargar los códigos si la lista no es del nivel actual"""
+        if checked and self._geo_filter_level != self.comboGeoLevel.currentData():
+            self.load_geo_codes()
+
+    def load_geo_codes(self):
+        """Llenar listGeoFilter para el nivel actual, reusando la selección si ya se visitó"""
         geo_level = self.comboGeoLevel.currentData()
         year = self.comboYear.currentData() or "2022"
 
         if not geo_level:
             return
 
+        # Nivel ya visitado: restaurar lista y selección sin volver a consultar
+        cached_entries = self._geo_state.get(geo_level)
+        if cached_entries is not None:
+            self.cancel_loader("geo_codes")
+            self.populate_geo_filter(cached_entries, geo_level)
+            self.check_loading_complete("geo_codes")
+            return
+
         self.lblDescription.setText("Cargando códigos geográficos...")
+        self._requested_geo_level = geo_level
 
         # Load in background thread
-        geo_thread = DataLoaderThread(
-            get_geographic_codes, "geo_codes", year=year, geo_level=geo_level
+        self.start_loader(
+            get_geographic_codes,
+            "geo_codes",
+            self.on_geo_codes_loaded,
+            year=year,
+            memo_arg=geo_level,
+            geo_level=geo_level,
         )
-        geo_thread.finished.connect(self.on_geo_codes_loaded)
-        geo_thread.error.connect(self.on_data_load_error)
-        self.loader_threads.append(geo_thread)
-        geo_thread.start()
 
     def on_entity_type_changed(self):
         """Load variables when entity type changes (async)"""
-        self.listVariables.clear()
+        self.clear_variable_list()
         self.clear_all_category_widgets()
         self.lblDescription.setText("Cargando variables...")
 
@@ -335,14 +574,18 @@ class CensoArgentinoDialog(QtWidgets.QDialog, FORM_CLASS):
         if not entity_type:
             return
 
+        # La carga inicial traería variables del tipo anterior
+        self.cancel_loader("initial")
+
         # Load in background thread
-        var_thread = DataLoaderThread(
-            get_variables, "variables", year=year, entity_type=entity_type
+        self.start_loader(
+            get_variables,
+            "variables",
+            self.on_variables_loaded,
+            year=year,
+            memo_arg=entity_type,
+            entity_type=entity_type,
         )
-        var_thread.finished.connect(self.on_variables_loaded)
-        var_thread.error.connect(self.on_data_load_error)
-        self.loader_threads.append(var_thread)
-        var_thread.start()
 
     def on_search_changed(self):
         """Debounce search input - restart timer on each keystroke"""
@@ -351,32 +594,58 @@ class CensoArgentinoDialog(QtWidgets.QDialog, FORM_CLASS):
 
     def perform_search(self):
         """Actually filter variables list based on search text (called after debounce)"""
-        search_text = self.searchVariables.text().lower()
+        search_text = self.searchVariables.text()
 
-        for i in range(self.listVariables.count()):
-            item = self.listVariables.item(i)
-            item_text = item.text().lower()
+        if not search_text:
+            matches = None  # Sin texto: mostrar todo
+        else:
+            # Búsquedas de 3+ caracteres usan el índice de trigramas
+            matches = search_trigram_index(
+                self._variable_trigrams, self._variable_search_texts, search_text
+            )
+            if matches is None:
+                # Búsquedas cortas: coincidencia por subcadena en C++ (insensible a mayúsculas)
+                matches = {
+                    self.listVariables.row(item)
+                    for item in self.listVariables.findItems(search_text, Qt.MatchContains)
+                }
+
+        if matches is None:
+            hidden = set()
+        else:
+            hidden = set(range(self.listVariables.count())) - matches
 
-            # Show item if search text is in the item text, hide otherwise
-            item.setHidden(search_text not in item_text)
+        # Solo tocar las filas cuya visibilidad cambia respecto de la búsqueda anterior
+        changed = hidden ^ self._hidden_variable_rows
+        self._hidden_variable_rows = hidden
+        if not changed:
+            return
 
-    def on_variable_changed(self):
-        """Update description and category selection when variables are checked"""
-        checked_count = 0
-        last_checked_code = None
-        currently_checked = set()
+        self.listVariables.setUpdatesEnabled(False)
+        try:
+            for i in changed:
+                self.listVariables.item(i).setHidden(i in hidden)
+        finally:
+            self.listVariables.setUpdatesEnabled(True)
+
+    def on_variable_changed(self, item):
+        """Update description and category selection when a variable is checked"""
+        # Actualizar solo la variable que cambió en vez de recorrer toda la lista
+        var_code = item.data(Qt.UserRole)
+        if item.checkState() == Qt.Checked:
+            self._checked_variables[var_code] = None
+        else:
+            self._checked_variables.pop(var_code, None)
+        self.sync_variable_selection()
 
-        for i in range(self.listVariables.count()):
-            item = self.listVariables.item(i)
-            if item.checkState() == Qt.Checked:
-                checked_count += 1
-                var_code = item.data(Qt.UserRole)
-                last_checked_code = var_code
-                currently_checked.add(var_code)
+    def sync_variable_selection(self):
+        """Reflejar _checked_variables en la descripción y los widgets de categorías"""
+        checked_count = len(self._checked_variables)
 
         # Update description
-        if checked_count == 1 and last_checked_code in self.variables:
-            self.lblDescription.setText(self.variables[last_checked_code])
+        if checked_count == 1:
+            (only_code,) = self._checked_variables
+            self.lblDescription.setText(self.variables.get(only_code, ""))
         elif checked_count > 1:
             self.lblDescription.setText(f"{checked_count} variables seleccionadas")
         else:
@@ -384,25 +653,31 @@ class CensoArgentinoDialog(QtWidgets.QDialog, FORM_CLASS):
 
         # Update category UI: remove unchecked variables, add newly checked ones
         for var_code in list(self.category_widgets.keys()):
-            if var_code not in currently_checked:
+            if var_code not in self._checked_variables:
                 self.remove_category_widget(var_code)
 
-        for var_code in currently_checked:
+        for var_code in self._checked_variables:
             if var_code not in self.category_widgets:
                 self.add_category_widget(var_code)
 
     def on_select_all_vars_clicked(self):
         """Select all visible variables in the list"""
-        for i in range(self.listVariables.count()):
-            item = self.listVariables.item(i)
-            if not item.isHidden():
-                item.setCheckState(Qt.Checked)
+        # Marcar en bloque y sincronizar una sola vez (no una vez por ítem)
+        with bulk_list_update(self.listVariables):
+            for i in range(self.listVariables.count()):
+                item = self.listVariables.item(i)
+                if not item.isHidden():
+                    item.setCheckState(Qt.Checked)
+                    self._checked_variables[item.data(Qt.UserRole)] = None
+        self.sync_variable_selection()
 
     def on_clear_all_vars_clicked(self):
         """Clear all variable selections"""
-        for i in range(self.listVariables.count()):
-            item = self.listVariables.item(i)
-            item.setCheckState(Qt.Unchecked)
+        with bulk_list_update(self.listVariables):
+            for i in range(self.listVariables.count()):
+                self.listVariables.item(i).setCheckState(Qt.Unchecked)
+        self._checked_variables = {}
+        self.sync_variable_selection()
 
     def add_category_widget(self, var_code):
         """Add collapsible category selection widget for a variable"""
@@ -502,12 +777,13 @@ class CensoArgentinoDialog(QtWidgets.QDialog, FORM_CLASS):
         geo_level = self.comboGeoLevel.currentData()
         variable_codes = [item.data(Qt.UserRole) for item in checked_variables]
 
-        # Get checked geographic filters (optional)
+        # Get checked geographic filters (optional, only while the filter is enabled)
         checked_geo_filters = []
-        for i in range(self.listGeoFilter.count()):
-            item = self.listGeoFilter.item(i)
-            if item.checkState() == Qt.Checked:
-                checked_geo_filters.append(item.data(Qt.UserRole))
+        if self.groupBoxGeoFilter.isChecked():
+            for i in range(self.listGeoFilter.count()):
+                item = self.listGeoFilter.item(i)
+                if item.checkState() == Qt.Checked:
+                    checked_geo_filters.append(item.data(Qt.UserRole))
 
         geo_filters = checked_geo_filters if checked_geo_filters else None
 
@@ -527,12 +803,7 @@ class CensoArgentinoDialog(QtWidgets.QDialog, FORM_CLASS):
 
                 # Always transform to WGS84 (EPSG:4326) for querying
                 if crs.authid() != "EPSG:4326":
-                    from qgis.core import QgsCoordinateReferenceSystem, QgsCoordinateTransform
-
-                    transform = QgsCoordinateTransform(
-                        crs, QgsCoordinateReferenceSystem("EPSG:4326"), QgsProject.instance()
-                    )
-                    extent = transform.transformBoundingBox(extent)
+                    extent = self.get_transform_to_wgs84(crs).transformBoundingBox(extent)
 
                     QgsMessageLog.logMessage(
                         f"Extensión transformada a EPSG:4326: {extent.xMinimum()}, {extent.yMinimum()}, {extent.xMaximum()}, {extent.yMaximum()}",
@@ -588,57 +859,91 @@ class CensoArgentinoDialog(QtWidgets.QDialog, FORM_CLASS):
                     return
 
             # Load single layer with all variables (filtered by selected categories)
-            layer = load_census_layer(
+            # en el pool del diálogo: la UI sigue respondiendo durante la consulta
+            loader = LayerLoaderRunnable(
+                load_census_layer,
+                "layer",
                 year=year,
                 variable_codes=variable_codes,
                 geo_level=geo_level,
                 geo_filters=geo_filters,
                 bbox=bbox,
                 selected_categories=selected_categories,
-                progress_callback=self.update_progress,
             )
+            loader.signals.progress.connect(self.update_progress)
+            loader.signals.finished.connect(self.on_layer_loaded)
+            loader.signals.error.connect(self.on_layer_load_error)
+            self.last_browse_query = ""
+            self.layer_loader = loader
+            self._loading_variable_count = len(variable_codes)
+            self.loader_pool.start(loader)
 
-            if layer.isValid():
-                QgsProject.instance().addMapLayer(layer)
+        except Exception as e:
+            self.on_layer_load_error(str(e), "layer")
 
-                # Log the query to Query Log tab
-                query_text = layer.customProperty("censo_query", "")
-                if query_text:
-                    self.log_query(query_text, "Browse")
+    def on_layer_loaded(self, layer, data_type):
+        """Agregar al proyecto la capa cargada en segundo plano"""
+        variable_count = self._loading_variable_count
+        if layer.isValid():
+            QgsProject.instance().addMapLayer(layer)
 
-                if len(variable_codes) == 1:
-                    self.lblDescription.setText("¡Capa cargada exitosamente con 1 variable!")
-                else:
-                    self.lblDescription.setText(
-                        f"¡Capa cargada exitosamente con {len(variable_codes)} variables!"
-                    )
-                QgsMessageLog.logMessage(
-                    f"Capa cargada: {layer.name()} con {len(variable_codes)} variables",
-                    "Censo Argentino",
-                    Qgis.Info,
-                )
+            # Log the query to Query Log tab
+            query_text = layer.customProperty("censo_query", "")
+            if query_text:
+                self.log_query(query_text, "Browse")
+
+            if variable_count == 1:
+                self.lblDescription.setText("¡Capa cargada exitosamente con 1 variable!")
             else:
-                self.lblDescription.setText("Error: Capa inválida")
-                QgsMessageLog.logMessage(
-                    "Se creó una capa inválida", "Censo Argentino", Qgis.Critical
+                self.lblDescription.setText(
+                    f"¡Capa cargada exitosamente con {variable_count} variables!"
                 )
-
-        except Exception as e:
-            self.lblDescription.setText(f"Error: {str(e)}")
             QgsMessageLog.logMessage(
-                f"Error cargando capa: {str(e)}", "Censo Argentino", Qgis.Critical
+                f"Capa cargada: {layer.name()} con {variable_count} variables",
+                "Censo Argentino",
+                Qgis.Info,
             )
-            # Log the query to Query Log tab even on error
-            if self.last_browse_query:
-                self.log_query(self.last_browse_query, f"Explorar (ERROR: {str(e)})")
-            else:
-                log_msg = f"-- ERROR: {str(e)}\n-- La consulta no fue capturada. Revise el panel de Mensajes de Registro de QGIS para más detalles.\n\n"
-                self.txtQueryLog.appendPlainText(log_msg)
+        else:
+            self.lblDescription.setText("Error: Capa inválida")
+            QgsMessageLog.logMessage("Se creó una capa inválida", "Censo Argentino", Qgis.Critical)
 
-        finally:
-            self.progressBar.hide()
-            self.lblStatus.hide()
-            self.btnLoad.setEnabled(True)
+        self.finish_layer_load()
+
+    def on_layer_load_error(self, error_message, data_type):
+        """Mostrar y registrar el error de una carga de capa"""
+        self.lblDescription.setText(f"Error: {error_message}")
+        QgsMessageLog.logMessage(
+            f"Error cargando capa: {error_message}", "Censo Argentino", Qgis.Critical
+        )
+        # Log the query to Query Log tab even on error
+        if self.last_browse_query:
+            self.log_query(self.last_browse_query, f"Explorar (ERROR: {error_message})")
+        else:
+            log_msg = f"-- ERROR: {error_message}\n-- La consulta no fue capturada. Revise el panel de Mensajes de Registro de QGIS para más detalles.\n\n"
+            self.txtQueryLog.appendPlainText(log_msg)
+
+        self.finish_layer_load()
+
+    def finish_layer_load(self):
+        """Restaurar los controles de carga al terminar (con o sin éxito)"""
+        self.layer_loader = None
+        self.progressBar.hide()
+        self.lblStatus.hide()
+        self.btnLoad.setEnabled(True)
+
+    def get_transform_to_wgs84(self, crs):
+        """Transformación de crs a EPSG:4326, creada una sola vez por CRS"""
+        from qgis.core import QgsCoordinateReferenceSystem, QgsCoordinateTransform
+
+        # CRS personalizados no tienen authid: usar su WKT como clave
+        key = crs.authid() or crs.toWkt()
+        transform = self._transforms.get(key)
+        if transform is None:
+            transform = QgsCoordinateTransform(
+                crs, QgsCoordinateReferenceSystem("EPSG:4326"), QgsProject.instance()
+            )
+            self._transforms[key] = transform
+        return transform
 
     def log_query(self, query, source="Explorar"):
         """Log query to the Query Log tab"""
@@ -687,7 +992,7 @@ class CensoArgentinoDialog(QtWidgets.QDialog, FORM_CLASS):
         """Update SQL tab progress"""
         self.progressBarSql.setValue(percent)
         self.lblSqlStatus.setText(message)
-        QCoreApplication.processEvents()
+        self.process_events_throttled(percent)
 
     def on_run_sql_clicked(self):
         """Execute SQL query"""
@@ -4,6 +4,7 @@ from qgis.PyQt.QtGui import QIcon
 from qgis.PyQt.QtWidgets import QAction, QMessageBox
 
 from .dialog import CensoArgentinoDialog
+from .query import _connection_pool
 
 MINIMUM_DUCKDB_VERSION = (1, 5, 0)
 
@@ -44,6 +45,11 @@ class CensoArgentinoPlugin:
         """Remove the plugin menu item and icon"""
         self.iface.removePluginMenu("&Censo Argentino", self.action)
         self.iface.removeToolBarIcon(self.action)
+        # Ningún hilo del diálogo puede seguir usando la conexión cuando se cierre
+        if self.dialog is not None:
+            self.dialog.shutdown_loaders()
+        # Liberar la conexión DuckDB compartida (extensiones y cachés HTTP)
+        _connection_pool.close()
 
     def run(self):
         """Show the dialog"""
@@ -1,18 +1,33 @@
 import json
-import re
+import os
+import threading
 import time
-import unicodedata
+import weakref
 from pathlib import Path
 
 import duckdb
-from qgis.core import QgsFeature, QgsField, QgsGeometry, QgsVectorLayer
+from qgis.core import QgsFeature, QgsFeatureSink, QgsField, QgsGeometry, QgsVectorLayer
 from qgis.PyQt.QtCore import QVariant
 
 from .config import CENSUS_CONFIG
+from .query_builders import (
+    build_geo_filter,
+    build_pivot_columns,
+    build_spatial_filter,
+    extract_pivot_column_names,
+    quote_identifier,
+    sanitize_category_label,  # noqa: F401 - API pública, usada por tests y scripts
+)
 
 # Límites de seguridad para prevenir uso excesivo de memoria
 MAX_COLUMNS = 500  # Límite duro de columnas por consulta
 DUCKDB_MEMORY_LIMIT = "4GB"  # Límite de memoria para DuckDB
+DUCKDB_THREADS = max(1, (os.cpu_count() or 2) - 1)  # Dejar un núcleo libre para la UI de QGIS
+FETCH_BATCH_SIZE = 4096  # Filas por lote al transmitir resultados a la capa
+
+# Registro detallado de cada carga (filtros, parámetros, SQL completo) en el
+# panel de mensajes de QGIS; activar con la variable de entorno CENSO_DEBUG=1
+DEBUG_LOGGING = os.environ.get("CENSO_DEBUG") == "1"
 
 
 class DuckDBConnectionPool:
@@ -21,6 +36,8 @@ class DuckDBConnectionPool:
     _instance = None
     _connection = None
     _extensions_loaded = False
+    _lock = threading.Lock()  # Los hilos de carga del diálogo inicializan en paralelo
+    _cursors = weakref.WeakSet()  # Cursores entregados, para poder interrumpirlos
 
     def __new__(cls):
         if cls._instance is None:
@@ -29,90 +46,152 @@ class DuckDBConnectionPool:
 
     def get_connection(self, load_extensions=True):
         """Obtener o crear una conexión DuckDB con extensiones cargadas"""
-        if self._connection is None:
-            self._connection = duckdb.connect()
+        with self._lock:
+            if self._connection is None:
+                connection = duckdb.connect()
+                try:
+                    connection.execute(f"SET threads = {DUCKDB_THREADS}")
+                    # Derrames a disco (disueltos y JOINs grandes) dentro del caché del
+                    # plugin en vez del directorio temporal por defecto
+                    temp_dir = get_cache_dir() / "duckdb_tmp"
+                    connection.execute(f"SET temp_directory = {sql_path_literal(temp_dir)}")
+                except Exception:
+                    connection.close()
+                    raise
+                # Publicar la conexión solo ya configurada: si la configuración
+                # falla, la próxima llamada vuelve a intentarlo desde cero
+                self._connection = connection
+
+            if load_extensions and not self._extensions_loaded:
+                self._load_extension("httpfs")
+                self._load_extension("spatial")
+                # Limitar memoria para prevenir consumo excesivo
+                self._connection.execute(f"SET memory_limit = '{DUCKDB_MEMORY_LIMIT}'")
+                # Reutilizar footers/metadatos de parquet remotos y conexiones HTTPS
+                # entre consultas de la sesión en vez de volver a pedirlos
+                self._connection.execute("SET enable_http_metadata_cache = true")
+                self._connection.execute("SET enable_object_cache = true")
+                self._connection.execute("SET http_keep_alive = true")
+                # Caché en memoria de bloques de archivos externos (parquet remotos) y
+                # de metadatos parquet ya parseados, reutilizados entre consultas
+                self._connection.execute("SET enable_external_file_cache = true")
+                self._connection.execute("SET parquet_metadata_cache = true")
+                self._enable_disk_http_cache()
+                self._extensions_loaded = True
+
+            return self._connection
+
+    def _load_extension(self, name, repository=None):
+        """Cargar una extensión, instalándola solo si aún no está en el directorio local.
+
+        INSTALL consulta el repositorio remoto de extensiones; una vez descargada
+        la extensión basta con LOAD desde disco.
+        """
+        row = self._connection.execute(
+            "SELECT installed FROM duckdb_extensions() WHERE extension_name = ?", [name]
+        ).fetchone()
+        if not (row and row[0]):
+            source = f" FROM {repository}" if repository else ""
+            self._connection.execute(f"INSTALL {name}{source}")
+        self._connection.execute(f"LOAD {name}")
+
+    def _enable_disk_http_cache(self):
+        """Cachear en disco los bloques leídos por httpfs (extensión comunitaria cache_httpfs).
+
+        Así radios.parquet y census-data.parquet se descargan una vez y sobreviven
+        al reinicio de QGIS. Si la extensión no está disponible (sin red, versión de
+        DuckDB sin build comunitario) se sigue solo con los cachés en memoria.
+        """
+        try:
+            self._load_extension("cache_httpfs", repository="community")
+            cache_dir = get_cache_dir() / "httpfs"
+            self._connection.execute("SET cache_httpfs_type = 'on_disk'")
+            self._connection.execute(
+                f"SET cache_httpfs_cache_directory = {sql_path_literal(cache_dir)}"
+            )
+        except duckdb.Error as e:
+            from qgis.core import Qgis, QgsMessageLog
 
-        if load_extensions and not self._extensions_loaded:
-            self._connection.execute("INSTALL httpfs; LOAD httpfs;")
-            self._connection.execute("INSTALL spatial; LOAD spatial;")
-            # Limitar memoria para prevenir consumo excesivo
-            self._connection.execute(f"SET memory_limit = '{DUCKDB_MEMORY_LIMIT}'")
-            self._extensions_loaded = True
+            QgsMessageLog.logMessage(
+                f"cache_httpfs no disponible, se usa solo el caché en memoria: {e}",
+                "Censo Argentino",
+                Qgis.Info,
+            )
 
-        return self._connection
+    def cursor(self, load_extensions=True):
+        """Obtener un cursor sobre la conexión compartida, seguro para usar desde otro hilo.
+
+        Un objeto de conexión DuckDB no debe usarse desde varios hilos a la vez.
+        Cada cursor es una conexión propia a la misma base en memoria y comparte
+        extensiones, configuración y cachés. Cerrar el cursor al terminar.
+        """
+        cursor = self.get_connection(load_extensions=load_extensions).cursor()
+        with self._lock:
+            self._cursors.add(cursor)
+        return cursor
+
+    def interrupt(self):
+        """Interrumpir las consultas en curso de todos los cursores abiertos.
+
+        La consulta interrumpida lanza duckdb.InterruptException en su hilo.
+        Los cursores ya cerrados se ignoran.
+        """
+        with self._lock:
+            cursors = list(self._cursors)
+        for cursor in cursors:
+            try:
+                cursor.interrupt()
+            except duckdb.Error:
+                pass
 
     def close(self):
         """Cerrar la conexión (típicamente solo necesario al descargar el plugin)"""
-        if self._connection is not None:
-            self._connection.close()
-            self._connection = None
-            self._extensions_loaded = False
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+                self._extensions_loaded = False
 
 
 # Global connection pool instance
 _connection_pool = DuckDBConnectionPool()
 
 
-def sanitize_category_label(label):
-    """
-    Convert category label to valid QGIS field name.
-
-    NO LENGTH TRUNCATION - Full names for modern GIS formats.
-    Shapefile users should export to GeoPackage or GeoParquet instead.
-
-    Rules:
-    - Lowercase only
-    - Underscores for spaces/hyphens
-    - Remove accents and special characters
-    - Must start with letter (prefix with 'cat_' if starts with digit)
-
-    Args:
-        label: Original category label (e.g., "Sin instrucción")
-
-    Returns:
-        Sanitized field name (e.g., "sin_instruccion")
-
-    Examples:
-        >>> sanitize_category_label("Sin instrucción")
-        'sin_instruccion'
-        >>> sanitize_category_label("0-14 años")
-        'cat_0_14_anos'
-        >>> sanitize_category_label("Primario completo")
-        'primario_completo'
-    """
-    if not label:
-        return "unknown"
+# Directorios de caché ya creados en esta sesión: evita un mkdir por cada lectura/escritura
+_created_cache_dirs = set()
 
-    # Remove accents/diacritics
-    label = unicodedata.normalize("NFKD", label).encode("ASCII", "ignore").decode()
 
-    # Convert to lowercase
-    label = label.lower()
+def get_cache_dir():
+    """Obtener o crear directorio de caché para datos del censo"""
+    cache_dir = Path.home() / ".cache" / "qgis-censo-argentino"
+    if cache_dir not in _created_cache_dirs:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        _created_cache_dirs.add(cache_dir)
+    return cache_dir
 
-    # Replace spaces, hyphens, and slashes with underscores
-    label = label.replace(" ", "_").replace("-", "_").replace("/", "_")
 
-    # Remove non-alphanumeric except underscores
-    label = re.sub(r"[^a-z0-9_]", "", label)
+def sql_path_literal(path):
+    """Ruta local como literal de texto SQL, con las comillas simples escapadas.
 
-    # Remove consecutive underscores
-    label = re.sub(r"_+", "_", label)
+    El directorio personal puede contener apóstrofos (por ejemplo /home/o'neil).
+    """
+    escaped = Path(path).as_posix().replace("'", "''")
+    return f"'{escaped}'"
 
-    # Remove leading/trailing underscores
-    label = label.strip("_")
 
-    # Ensure starts with letter
-    if label and label[0].isdigit():
-        label = "cat_" + label
+def bundled_data_file(filename):
+    """Ruta de un archivo parquet empaquetado con el plugin (directorio data/)"""
+    return os.path.join(os.path.dirname(__file__), "data", filename)
 
-    return label or "unknown"
 
+def bundled_data_version(filename):
+    """Firma (mtime y tamaño) de un archivo empaquetado.
 
-def get_cache_dir():
-    """Obtener o crear directorio de caché para datos del censo"""
-    cache_dir = Path.home() / ".cache" / "qgis-censo-argentino"
-    cache_dir.mkdir(parents=True, exist_ok=True)
-    return cache_dir
+    Se incluye en las claves de caché para que regenerar o actualizar los
+    parquet empaquetados invalide automáticamente los resultados guardados.
+    """
+    stat = os.stat(bundled_data_file(filename))
+    return f"{int(stat.st_mtime)}_{stat.st_size}"
 
 
 def get_cached_data(cache_key):
@@ -161,9 +240,9 @@ def save_cached_data(cache_key, data):
     temp_file = cache_file.with_suffix(".json.tmp")
 
     try:
-        # Escribir a archivo temporal primero
+        # Escribir a archivo temporal primero (JSON compacto: lo lee la máquina, no una persona)
         with open(temp_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
 
         # Renombrar atómicamente (en la mayoría de sistemas de archivos)
         temp_file.replace(cache_file)
@@ -176,6 +255,41 @@ def save_cached_data(cache_key, data):
             pass
 
 
+# Memoización en proceso de búsquedas inmutables: (función, año, argumento) -> resultado.
+# La clave usa el objeto función, no su nombre
+_lookup_memo = {}
+
+
+def memoized_lookup(func, year, arg=None):
+    """Devolver un resultado ya calculado en esta sesión sin tocar disco ni DuckDB.
+
+    Args:
+        func: get_variables, get_geographic_codes, preload_all_metadata o
+            get_initial_data
+        year: Año del censo
+        arg: entity_type o geo_level según la función (None para metadatos)
+
+    Returns:
+        Copia superficial del resultado memorizado (los valores anidados del
+        mapa de metadatos son de solo lectura), o None si todavía no se consultó
+    """
+    if func is get_initial_data:
+        # get_initial_data no memoriza nada propio: está completo cuando lo
+        # están sus dos partes
+        metadata_map = memoized_lookup(preload_all_metadata, year)
+        variables = memoized_lookup(get_variables, year, arg)
+        if metadata_map is None or variables is None:
+            return None
+        return metadata_map, variables
+
+    result = _lookup_memo.get((func, year, arg))
+    if isinstance(result, list):
+        return list(result)
+    if isinstance(result, dict):
+        return dict(result)
+    return result
+
+
 def get_entity_types(year="2022", progress_callback=None):
     """Obtener tipos de entidad desde configuración (sin red)
 
@@ -195,35 +309,12 @@ def get_entity_types(year="2022", progress_callback=None):
     return config["entities"]
 
 
-def _get_entity_types_legacy(year="2022", progress_callback=None):
-    """DEPRECATED: Versión anterior que consultaba la red. Mantener por referencia."""
-    import os
-
-    config = CENSUS_CONFIG[year]
-    bundled_file = os.path.join(os.path.dirname(__file__), "data", "metadata.parquet")
-
-    try:
-        con = _connection_pool.get_connection(load_extensions=True)
-
-        entities = config["entities"]
-        placeholders = ", ".join([f"'{e}'" for e in entities])
-
-        query = f"""
-            SELECT DISTINCT entidad
-            FROM '{bundled_file}'
-            WHERE year = ? AND entidad IN ({placeholders})
-            ORDER BY entidad
-        """  # nosec B608 - bundled_file from os.path.join(__file__), entities from config
-
-        result = con.execute(query, [year]).fetchall()
-        return [row[0] for row in result]
-    except Exception as e:
-        raise Exception(f"Error cargando tipos de entidad: {str(e)}")
-
-
 def get_geographic_codes(year="2022", geo_level="PROV", progress_callback=None):
     """Obtener códigos geográficos desde archivo local empaquetado (sin red)
 
+    Los resultados se memorizan en el proceso y se guardan en el caché en disco,
+    así que después de la primera consulta no se abre ninguna conexión DuckDB.
+
     Args:
         year: Año del censo ("2022", "2010", "2001", "1991")
         geo_level: Nivel geográfico - "RADIO", "FRACC", "DEPTO", o "PROV"
@@ -232,17 +323,33 @@ def get_geographic_codes(year="2022", geo_level="PROV", progress_callback=None):
     Returns:
         Lista de tuplas: (código, etiqueta) para cada unidad geográfica
     """
-    import os
-
     if progress_callback:
         progress_callback(50, f"Cargando códigos de {geo_level}...")
 
+    memo_key = (get_geographic_codes, year, geo_level)
+    if memo_key not in _lookup_memo:
+        _lookup_memo[memo_key] = _load_geographic_codes(year, geo_level)
+    geo_codes = list(_lookup_memo[memo_key])
+
+    if progress_callback:
+        progress_callback(100, f"Códigos de {geo_level} cargados ({len(geo_codes)} registros)")
+
+    return geo_codes
+
+
+def _load_geographic_codes(year, geo_level):
+    """Leer códigos geográficos del caché en disco o del parquet empaquetado"""
     # Usar archivo empaquetado con el plugin (sin red, instantáneo)
-    bundled_file = os.path.join(os.path.dirname(__file__), "data", "geocodes.parquet")
+    bundled_file = bundled_data_file("geocodes.parquet")
 
     try:
-        # Conexión local sin extensiones (thread-safe, no necesita httpfs/spatial)
-        con = duckdb.connect()
+        cache_key = f"geocodes_{year}_{geo_level}_{bundled_data_version('geocodes.parquet')}"
+        cached = get_cached_data(cache_key)
+        if cached is not None:
+            return [(row[0], row[1]) for row in cached]
+
+        # Cursor sobre la conexión compartida (archivo local, no necesita httpfs/spatial)
+        con = _connection_pool.cursor(load_extensions=False)
 
         query = f"""
             SELECT code, label
@@ -253,9 +360,7 @@ def get_geographic_codes(year="2022", geo_level="PROV", progress_callback=None):
         result = con.execute(query, [year, geo_level]).fetchall()
         geo_codes = [(row[0], row[1]) for row in result]
         con.close()
-
-        if progress_callback:
-            progress_callback(100, f"Códigos de {geo_level} cargados ({len(geo_codes)} registros)")
+        save_cached_data(cache_key, geo_codes)
 
         return geo_codes
     except Exception as e:
@@ -266,6 +371,11 @@ def preload_all_metadata(year="2022", progress_callback=None):
     """
     Cargar metadatos desde archivo local empaquetado (sin red).
 
+    El mapa resultante se memoriza en el proceso y se guarda en el caché en
+    disco bajo la misma clave que consulta get_variable_categories, de modo que
+    las búsquedas de categorías posteriores no vuelven a leer el parquet.
+    El diccionario devuelto es compartido: no modificarlo.
+
     Args:
         year: Año del censo ("2022", "2010", "2001", "1991")
         progress_callback: Callback opcional(porcentaje, mensaje) para actualizaciones de progreso
@@ -279,17 +389,34 @@ def preload_all_metadata(year="2022", progress_callback=None):
             }
         }
     """
-    import os
-
     if progress_callback:
         progress_callback(5, f"Cargando metadatos del censo {year}...")
 
+    memo_key = (preload_all_metadata, year, None)
+    if memo_key not in _lookup_memo:
+        _lookup_memo[memo_key] = _load_all_metadata(year)
+    # Copia superficial: quien reciba el mapa no altera el memorizado
+    metadata_map = dict(_lookup_memo[memo_key])
+
+    if progress_callback:
+        progress_callback(100, f"Metadatos {year} cargados: {len(metadata_map)} variables")
+
+    return metadata_map
+
+
+def _load_all_metadata(year):
+    """Leer el mapa de categorías del caché en disco o del parquet empaquetado"""
     # Usar archivo empaquetado con el plugin (sin red, instantáneo)
-    bundled_file = os.path.join(os.path.dirname(__file__), "data", "metadata.parquet")
+    bundled_file = bundled_data_file("metadata.parquet")
 
     try:
-        # Conexión local sin extensiones (thread-safe, no necesita httpfs/spatial)
-        con = duckdb.connect()
+        cache_key = _all_metadata_cache_key(year)
+        cached = get_cached_data(cache_key)
+        if cached is not None:
+            return _metadata_from_cache(cached)
+
+        # Cursor sobre la conexión compartida (archivo local, no necesita httpfs/spatial)
+        con = _connection_pool.cursor(load_extensions=False)
 
         query = f"""
             SELECT
@@ -321,8 +448,7 @@ def preload_all_metadata(year="2022", progress_callback=None):
             else:
                 metadata_map[var_code]["has_nulls"] = True
 
-        if progress_callback:
-            progress_callback(100, f"Metadatos {year} cargados: {len(metadata_map)} variables")
+        save_cached_data(cache_key, metadata_map)
 
         return metadata_map
 
@@ -330,6 +456,22 @@ def preload_all_metadata(year="2022", progress_callback=None):
         raise Exception(f"Error al precargar metadatos: {str(e)}")
 
 
+def _metadata_from_cache(cached):
+    """Reconstruir las tuplas (valor, etiqueta) del mapa de metadatos leído de JSON"""
+    return {
+        var_code: {
+            "categories": [(cat[0], cat[1]) for cat in cat_data["categories"]],
+            "has_nulls": cat_data["has_nulls"],
+        }
+        for var_code, cat_data in cached.items()
+    }
+
+
+def _all_metadata_cache_key(year):
+    """Clave de caché del mapa completo de metadatos de un año"""
+    return f"all_metadata_{year}_{bundled_data_version('metadata.parquet')}"
+
+
 def get_variable_categories(year="2022", variable_code=None, progress_callback=None, retry_count=3):
     """
     Obtener categorías para una variable del caché de metadatos precargados.
@@ -354,8 +496,14 @@ def get_variable_categories(year="2022", variable_code=None, progress_callback=N
     config = CENSUS_CONFIG[year]
     metadata_url = config["urls"]["metadata"]
 
-    # Try to get from preloaded metadata first
-    all_metadata = get_cached_data(f"all_metadata_{year}")
+    # Try to get from preloaded metadata first (memoria del proceso, luego disco)
+    memo_key = (preload_all_metadata, year, None)
+    all_metadata = _lookup_memo.get(memo_key)
+    if all_metadata is None:
+        cached = get_cached_data(_all_metadata_cache_key(year))
+        if cached is not None:
+            # Memorizar el mapa leído: las búsquedas siguientes no vuelven a parsear el JSON
+            all_metadata = _lookup_memo.setdefault(memo_key, _metadata_from_cache(cached))
     if all_metadata and variable_code in all_metadata:
         return all_metadata[variable_code]
 
@@ -371,7 +519,7 @@ def get_variable_categories(year="2022", variable_code=None, progress_callback=N
 
     for attempt in range(retry_count):
         try:
-            con = _connection_pool.get_connection(load_extensions=True)
+            con = _connection_pool.cursor(load_extensions=True)
 
             query_categories = f"""
                 SELECT DISTINCT
@@ -394,6 +542,7 @@ def get_variable_categories(year="2022", variable_code=None, progress_callback=N
             """  # nosec B608 - metadata_url from CENSUS_CONFIG, user input via ?
 
             null_count = con.execute(query_nulls, [variable_code]).fetchone()[0]
+            con.close()
             has_nulls = null_count > 0
 
             result_dict = {"categories": categories, "has_nulls": has_nulls}
@@ -418,6 +567,9 @@ def get_variable_categories(year="2022", variable_code=None, progress_callback=N
 def get_variables(year="2022", entity_type=None, progress_callback=None):
     """Obtener variables desde archivo local empaquetado (sin red)
 
+    Los resultados se memorizan en el proceso y se guardan en el caché en disco,
+    así que después de la primera consulta no se abre ninguna conexión DuckDB.
+
     Args:
         year: Año del censo ("2022", "2010", "2001", "1991")
         entity_type: Tipo de entidad (HOGAR, PERSONA, VIVIENDA) o None para todas
@@ -426,17 +578,61 @@ def get_variables(year="2022", entity_type=None, progress_callback=None):
     Returns:
         Lista de tuplas (codigo_variable, etiqueta_variable)
     """
-    import os
-
     if progress_callback:
         progress_callback(30, "Cargando metadatos de variables...")
 
+    memo_key = (get_variables, year, entity_type)
+    if memo_key not in _lookup_memo:
+        _lookup_memo[memo_key] = _load_variables(year, entity_type)
+    variables = list(_lookup_memo[memo_key])
+
+    if progress_callback:
+        progress_callback(100, f"Variables cargadas ({len(variables)} variables)")
+
+    return variables
+
+
+def get_initial_data(year="2022", entity_type=None, progress_callback=None):
+    """Cargar en una sola pasada los datos que necesita el diálogo al abrirse.
+
+    Agrupa preload_all_metadata y get_variables para que el diálogo use un solo
+    hilo y un solo cursor caliente en lugar de dos cargas en paralelo.
+
+    Args:
+        year: Año del censo ("2022", "2010", "2001", "1991")
+        entity_type: Tipo de entidad (HOGAR, PERSONA, VIVIENDA) o None para todas
+        progress_callback: Callback opcional para actualizaciones de progreso
+
+    Returns:
+        Tupla (metadata_map, variables) con los mismos formatos que
+        preload_all_metadata y get_variables
+    """
+    metadata_map = preload_all_metadata(year=year)
+    if progress_callback:
+        progress_callback(50, f"Metadatos {year} cargados: {len(metadata_map)} variables")
+
+    variables = get_variables(year=year, entity_type=entity_type)
+    if progress_callback:
+        progress_callback(100, f"Variables cargadas ({len(variables)} variables)")
+
+    return metadata_map, variables
+
+
+def _load_variables(year, entity_type):
+    """Leer variables del caché en disco o del parquet empaquetado"""
     # Usar archivo empaquetado con el plugin (sin red, instantáneo)
-    bundled_file = os.path.join(os.path.dirname(__file__), "data", "metadata.parquet")
+    bundled_file = bundled_data_file("metadata.parquet")
 
     try:
-        # Conexión local sin extensiones (thread-safe, no necesita httpfs/spatial)
-        con = duckdb.connect()
+        cache_key = (
+            f"variables_{year}_{entity_type or 'TODAS'}_{bundled_data_version('metadata.parquet')}"
+        )
+        cached = get_cached_data(cache_key)
+        if cached is not None:
+            return [(row[0], row[1]) for row in cached]
+
+        # Cursor sobre la conexión compartida (archivo local, no necesita httpfs/spatial)
+        con = _connection_pool.cursor(load_extensions=False)
 
         if entity_type:
             query = f"""
@@ -457,9 +653,7 @@ def get_variables(year="2022", entity_type=None, progress_callback=None):
 
         con.close()
         variables = [(row[0], row[1]) for row in result]
-
-        if progress_callback:
-            progress_callback(100, f"Variables cargadas ({len(variables)} variables)")
+        save_cached_data(cache_key, variables)
 
         return variables
     except Exception as e:
@@ -506,6 +700,114 @@ def calculate_column_count(year="2022", variable_codes=None, selected_categories
     return total_columns
 
 
+def remote_file_version(con, url):
+    """Firma (tamaño y última modificación) de un archivo remoto.
+
+    read_blob sin la columna content solo consulta los metadatos HTTP del
+    archivo (Content-Length y Last-Modified), no lo descarga. Se consulta una
+    vez por sesión: las cargas siguientes no repiten el pedido HTTP.
+
+    Returns:
+        Texto "<tamaño>-<epoch>", o None si no se pudieron leer los metadatos
+    """
+    memo_key = (remote_file_version, url, None)
+    if memo_key not in _lookup_memo:
+        version = _read_remote_file_version(con, url)
+        if version is None:
+            return None  # Sin memorizar: la próxima carga vuelve a intentar
+        _lookup_memo[memo_key] = version
+    return _lookup_memo[memo_key]
+
+
+def _read_remote_file_version(con, url):
+    """Leer tamaño y última modificación de url con DuckDB (ver remote_file_version)"""
+    try:
+        row = con.execute(
+            "SELECT size, epoch(last_modified)::BIGINT FROM read_blob(?)", [url]
+        ).fetchone()
+    except duckdb.Error:
+        return None
+    if row is None or row[1] is None:
+        return None
+    return f"{row[0]}-{row[1]}"
+
+
+def _dissolved_cache_path(year, geo_level, version):
+    """Archivo del caché local con las geometrías disueltas de todo un nivel.
+
+    El disuelto no depende del filtro geográfico (se filtra al leerlo); la
+    versión de radios.parquet en el nombre descarta el archivo si la fuente cambia.
+    """
+    return get_cache_dir() / "dissolved" / f"{year}_{geo_level}_{version}.parquet"
+
+
+def _ensure_dissolved_cache(con, cache_path, radios_url, geom_col, geo_config_level):
+    """Disolver todos los radios a un nivel y guardarlos en el caché local.
+
+    Los límites de un nivel no dependen de las variables ni del filtro elegidos:
+    disolverlos una vez evita repetir ST_MemUnion_Agg sobre el parquet remoto en
+    cada carga. Al escribir una versión nueva se borran las anteriores del mismo
+    año y nivel. Se llama desde cargas sin filtro geográfico, que disuelven todo
+    el nivel de todos modos.
+
+    Returns:
+        Ruta del parquet con (geo_id, wkb), o None si no se pudo escribir
+        (la carga sigue con el disuelto en la consulta)
+    """
+    if cache_path.exists():
+        return cache_path
+
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = cache_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        con.execute(
+            f"""
+            COPY (
+                SELECT
+                    {geo_config_level["id_field"]} as geo_id,
+                    ST_AsWKB(ST_Force2D(ST_MemUnion_Agg(g.geometry))) as wkb
+                FROM (
+                    SELECT {geo_config_level["radio_cols"]}, {geom_col} as geometry
+                    FROM '{radios_url}'
+                ) g
+                GROUP BY {geo_config_level["group_cols"]}
+            ) TO {sql_path_literal(temp_path)} (FORMAT PARQUET)
+            """  # nosec B608 - URLs y columnas de CENSUS_CONFIG
+        )
+        # Renombrado atómico: una carga concurrente nunca lee un archivo a medias
+        temp_path.replace(cache_path)
+    except (duckdb.Error, OSError) as e:
+        from qgis.core import Qgis, QgsMessageLog
+
+        QgsMessageLog.logMessage(
+            f"No se pudo guardar el disuelto en caché, se calcula en la consulta: {e}",
+            "Censo Argentino",
+            Qgis.Info,
+        )
+        try:
+            if temp_path.exists():
+                temp_path.unlink()
+        except OSError:
+            pass
+        return None
+
+    # Versiones anteriores de este año y nivel: ya no corresponden a la fuente
+    year_level = cache_path.name.rsplit("_", 1)[0]
+    for stale in cache_path.parent.glob(f"{year_level}_*.parquet"):
+        if stale != cache_path:
+            try:
+                stale.unlink()
+            except OSError:
+                pass
+    return cache_path
+
+
+def check_cancelled(is_cancelled):
+    """Abandonar la carga si el callable de cancelación indica que hay que parar."""
+    if is_cancelled is not None and is_cancelled():
+        raise Exception("Carga cancelada")
+
+
 def load_census_layer(
     year="2022",
     variable_codes=None,
@@ -514,6 +816,7 @@ def load_census_layer(
     bbox=None,
     selected_categories=None,
     progress_callback=None,
+    is_cancelled=None,
 ):
     """Ejecutar join en DuckDB y devolver QgsVectorLayer con datos del censo para múltiples variables.
 
@@ -527,6 +830,8 @@ def load_census_layer(
                            Ejemplo: {"PERSONA_P11": ["1", "2"]}
                            Si es None o vacío para una variable, se incluyen todas las categorías
         progress_callback: Callback opcional para actualizaciones de progreso
+        is_cancelled: Callable opcional; si devuelve True la carga se abandona
+                      antes de la consulta o entre lotes de resultados
 
     Returns:
         QgsVectorLayer con geometría y columnas de categorías expandidas
@@ -547,34 +852,40 @@ def load_census_layer(
     radios_url = config["urls"]["radios"]
     census_url = config["urls"]["census"]
 
+    con = None
     try:
         if progress_callback:
             progress_callback(2, "Inicializando conexión DuckDB...")
 
-        con = _connection_pool.get_connection(load_extensions=True)
+        # Cursor propio: el resultado se consume por lotes mientras otros hilos
+        # pueden seguir usando la conexión compartida
+        con = _connection_pool.cursor(load_extensions=True)
 
         # PHASE 4.1: Fetch categories for all variables with retry logic
         if progress_callback:
             progress_callback(5, f"Obteniendo categorías para {len(variable_codes)} variables...")
 
-        # Import query_builders functions (try relative import first for QGIS plugin context)
-        try:
-            from .query_builders import build_geo_filter, build_pivot_columns, build_spatial_filter
-        except ImportError:
-            from query_builders import build_geo_filter, build_pivot_columns, build_spatial_filter
-
         variable_categories_map = {}
         failed_variables = []
 
+        # Un solo mapa de metadatos para todas las variables (memorizado en el
+        # proceso); get_variable_categories queda solo para códigos ausentes
+        try:
+            metadata_map = preload_all_metadata(year=year)
+        except Exception:
+            metadata_map = {}
+
         for idx, var_code in enumerate(variable_codes):
             try:
-                result = get_variable_categories(
-                    year=year, variable_code=var_code, progress_callback=progress_callback
-                )
+                result = metadata_map.get(var_code)
+                if result is None:
+                    result = get_variable_categories(
+                        year=year, variable_code=var_code, progress_callback=progress_callback
+                    )
 
                 # Filter categories based on selected_categories if provided
                 if selected_categories and var_code in selected_categories:
-                    selected_vals = selected_categories[var_code]
+                    selected_vals = set(selected_categories[var_code])
                     if selected_vals:  # If list is not empty, filter
                         filtered_cats = [
                             (val, label)
@@ -647,18 +958,21 @@ def load_census_layer(
                 "dissolve": False,
             },
             "FRACC": {
+                "radio_cols": "PROV, DEPTO, FRACC",
                 "group_cols": "g.PROV, g.DEPTO, g.FRACC",
                 "id_field": "g.PROV || '-' || g.DEPTO || '-' || g.FRACC",
                 "id_alias": "geo_id",
                 "dissolve": True,
             },
             "DEPTO": {
+                "radio_cols": "PROV, DEPTO",
                 "group_cols": "g.PROV, g.DEPTO",
                 "id_field": "g.PROV || '-' || g.DEPTO",
                 "id_alias": "geo_id",
                 "dissolve": True,
             },
             "PROV": {
+                "radio_cols": "PROV",
                 "group_cols": "g.PROV",
                 "id_field": "g.PROV",
                 "id_alias": "geo_id",
@@ -672,61 +986,136 @@ def load_census_layer(
         geo_filter, geo_params, census_prov_filter, census_prov_params = build_geo_filter(
             geo_level, geo_filters, geo_id_col=geo_id_col
         )
-        spatial_filter = build_spatial_filter(bbox, geometry_column=geom_col)
+        spatial_filter, spatial_params = build_spatial_filter(bbox, geometry_column=geom_col)
 
         # PHASE 4.4: Build CTE-based query (FIXES CARTESIAN PRODUCT BUG)
         # Step 1: Build pivot columns SQL using category expansion
-        pivot_sql = build_pivot_columns(variable_codes, variable_categories_map)
-
-        # Step 2: Build query parameters (variables first, then geo filters, then census prov filter)
-        # Census prov_code filter params go after variable codes in JOIN condition
-        query_params = list(variable_codes) + census_prov_params + geo_params
+        pivot_sql, pivot_params = build_pivot_columns(variable_codes, variable_categories_map)
+
+        # Step 2: Build query parameters in the textual order of their placeholders:
+        # filtered_radios (geo filter, then bbox), the pivot columns of
+        # census_pivoted, then the census subquery (variable codes, then census
+        # prov_code filter)
+        query_params = (
+            geo_params + spatial_params + pivot_params + list(variable_codes) + census_prov_params
+        )
 
         # Step 3: Build variable filter for CTE
         variable_placeholders = ", ".join(["?" for _ in variable_codes])
         census_where_clause = f"codigo_variable IN ({variable_placeholders})"
 
-        # Step 4: Build list of all column names from the pivot
-        # Extract column names from pivot_sql (format: "... as \"column_name\"")
-        import re
+        # Subconsulta sobre el parquet censal: proyecta solo las columnas que usan
+        # el JOIN y el pivot, y aplica los filtros directamente sobre el escaneo
+        # para que DuckDB descarte row groups por estadísticas de codigo_variable
+        # y prov_code antes del JOIN
+        census_source = f"""(
+                        SELECT id_geo, codigo_variable, valor_categoria, conteo
+                        FROM '{census_url}'
+                        WHERE {census_where_clause}{census_prov_filter}
+                    )"""  # nosec B608 - census_url from CENSUS_CONFIG, user input via ?
 
-        column_names = re.findall(r'as "([^"]+)"', pivot_sql)
+        # Step 4: Build list of all column names from the pivot
+        # Nombres sin citar para los campos de la capa; citados para reusarlos en el SQL
+        column_names = extract_pivot_column_names(pivot_sql)
+        quoted_columns = [quote_identifier(col) for col in column_names]
+
+        # Geometrías disueltas desde el caché local cuando no hay bbox: con bbox
+        # el disuelto depende de la ventana y se sigue calculando en la consulta.
+        # Sin versión de la fuente (metadatos HTTP no disponibles) no se usa el caché
+        dissolved_path = None
+        if geo_config_level["dissolve"] and not bbox:
+            radios_version = remote_file_version(con, radios_url)
+            if radios_version is not None:
+                cache_path = _dissolved_cache_path(year, geo_level, radios_version)
+                if cache_path.exists():
+                    dissolved_path = cache_path
+                elif not geo_filter:
+                    # Sin filtro la consulta disolvería todo el nivel igual: guardarlo.
+                    # Con filtro se disuelven en la consulta solo las unidades pedidas
+                    if progress_callback:
+                        progress_callback(
+                            15, f"Disolviendo geometrías de {geo_level} (solo la primera vez)..."
+                        )
+                    check_cancelled(is_cancelled)
+                    dissolved_path = _ensure_dissolved_cache(
+                        con, cache_path, radios_url, geom_col, geo_config_level
+                    )
 
         # Step 5: Build CTE that pivots census data with EARLY spatial filtering
         # OPTIMIZATION: Filter radios by bbox FIRST to reduce data loaded into memory.
         # Old approach: CTE loaded ALL radios, then filtered by bbox at the end.
         # New approach: First CTE filters radios by bbox, then joins only matching data.
-        if geo_config_level["dissolve"]:
+        if dissolved_path is not None:
+            # Totales por nivel desde los radios filtrados (sin leer su geometría) y
+            # geometría desde el parquet local ya disuelto: el JOIN con level_totals
+            # deja solo las unidades que pasan el filtro geográfico
+            sum_columns = ", ".join([f"SUM(cp.{col})::DOUBLE as {col}" for col in quoted_columns])
+            level_columns = ", ".join([f"lt.{col}" for col in quoted_columns])
+
+            query = f"""
+                WITH filtered_radios AS (
+                    SELECT {geo_id_col}, {geo_config_level["radio_cols"]}
+                    FROM '{radios_url}'
+                    WHERE 1=1 {geo_filter}
+                ),
+                census_pivoted AS (
+                    SELECT
+                        r.{geo_id_col},
+                        {pivot_sql}
+                    FROM filtered_radios r
+                    LEFT JOIN {census_source} c
+                        ON r.{geo_id_col} = c.id_geo
+                    GROUP BY r.{geo_id_col}
+                ),
+                level_totals AS (
+                    SELECT
+                        {geo_config_level["id_field"]} as geo_id,
+                        {sum_columns}
+                    FROM filtered_radios g
+                    JOIN census_pivoted cp ON g.{geo_id_col} = cp.{geo_id_col}
+                    GROUP BY {geo_config_level["group_cols"]}
+                )
+                SELECT
+                    lt.geo_id,
+                    d.wkb,
+                    {level_columns}
+                FROM level_totals lt
+                JOIN {sql_path_literal(dissolved_path)} d ON d.geo_id = lt.geo_id
+            """  # nosec B608
+        elif geo_config_level["dissolve"]:
             # For dissolved geometries: filter first, then aggregate to target level
-            sum_columns = ", ".join([f'SUM(cp."{col}") as "{col}"' for col in column_names])
+            # Cast a DOUBLE en DuckDB: las filas llegan con floats listos para QgsField Double
+            sum_columns = ", ".join([f"SUM(cp.{col})::DOUBLE as {col}" for col in quoted_columns])
 
+            # Proyección explícita por nivel: de radios.parquet se leen solo el ID
+            # del radio, las columnas de agrupación del nivel y la geometría
             query = f"""
                 WITH filtered_radios AS (
-                    SELECT {geo_id_col}, PROV, DEPTO, FRACC, RADIO, {geom_col} as geometry
+                    SELECT {geo_id_col}, {geo_config_level["radio_cols"]}, {geom_col} as geometry
                     FROM '{radios_url}'
                     WHERE 1=1 {geo_filter} {spatial_filter}
                 ),
                 census_pivoted AS (
                     SELECT
-                        r.PROV, r.DEPTO, r.FRACC, r.RADIO,
+                        r.{geo_id_col},
                         {pivot_sql}
                     FROM filtered_radios r
-                    LEFT JOIN '{census_url}' c
-                        ON r.{geo_id_col} = c.id_geo AND {census_where_clause}{census_prov_filter}
-                    GROUP BY r.PROV, r.DEPTO, r.FRACC, r.RADIO
+                    LEFT JOIN {census_source} c
+                        ON r.{geo_id_col} = c.id_geo
+                    GROUP BY r.{geo_id_col}
                 )
                 SELECT
                     {geo_config_level["id_field"]} as geo_id,
-                    ST_AsText(ST_MemUnion_Agg(g.geometry)) as wkt,
+                    ST_AsWKB(ST_Force2D(ST_MemUnion_Agg(g.geometry))) as wkb,
                     {sum_columns}
                 FROM filtered_radios g
-                JOIN census_pivoted cp
-                    ON g.PROV = cp.PROV AND g.DEPTO = cp.DEPTO AND g.FRACC = cp.FRACC AND g.RADIO = cp.RADIO
+                JOIN census_pivoted cp ON g.{geo_id_col} = cp.{geo_id_col}
                 GROUP BY {geo_config_level["group_cols"]}
             """  # nosec B608
         else:
             # For RADIO level: filter first, then pivot only matching radios
-            select_columns = ", ".join([f'cp."{col}"' for col in column_names])
+            # Cast a DOUBLE en DuckDB: las filas llegan con floats listos para QgsField Double
+            select_columns = ", ".join([f"cp.{col}::DOUBLE as {col}" for col in quoted_columns])
 
             query = f"""
                 WITH filtered_radios AS (
@@ -739,13 +1128,13 @@ def load_census_layer(
                         r.{geo_id_col},
                         {pivot_sql}
                     FROM filtered_radios r
-                    LEFT JOIN '{census_url}' c
-                        ON r.{geo_id_col} = c.id_geo AND {census_where_clause}{census_prov_filter}
+                    LEFT JOIN {census_source} c
+                        ON r.{geo_id_col} = c.id_geo
                     GROUP BY r.{geo_id_col}
                 )
                 SELECT
                     g.{geo_id_col} as geo_id,
-                    ST_AsText(g.geometry) as wkt,
+                    ST_AsWKB(ST_Force2D(g.geometry)) as wkb,
                     {select_columns}
                 FROM filtered_radios g
                 JOIN census_pivoted cp ON g.{geo_id_col} = cp.{geo_id_col}
@@ -754,44 +1143,49 @@ def load_census_layer(
         if progress_callback:
             progress_callback(20, "Construyendo consulta...")
 
-        # Log the query for debugging
         from qgis.core import Qgis, QgsMessageLog
 
-        QgsMessageLog.logMessage("=== DEBUG DE CONSULTA CENSO ===", "Censo Argentino", Qgis.Info)
-        QgsMessageLog.logMessage(f"Nivel Geográfico: {geo_level}", "Censo Argentino", Qgis.Info)
-        QgsMessageLog.logMessage(
-            f"Códigos de variables: {variable_codes}", "Censo Argentino", Qgis.Info
-        )
-        QgsMessageLog.logMessage(
-            f"Total de columnas expandidas: {total_columns}", "Censo Argentino", Qgis.Info
-        )
-        QgsMessageLog.logMessage(
-            f"Filtros geográficos: {geo_filters if geo_filters else 'Ninguno'}",
-            "Censo Argentino",
-            Qgis.Info,
-        )
-        if bbox:
-            QgsMessageLog.logMessage(f"Filtro bbox: {bbox}", "Censo Argentino", Qgis.Info)
-        QgsMessageLog.logMessage(
-            f"Parámetros de consulta: {query_params}", "Censo Argentino", Qgis.Info
-        )
-        QgsMessageLog.logMessage(
-            f"Filtro geográfico SQL: {geo_filter if geo_filter else 'Ninguno'}",
-            "Censo Argentino",
-            Qgis.Info,
-        )
-        QgsMessageLog.logMessage(
-            f"Filtro espacial SQL: {spatial_filter if spatial_filter else 'Ninguno'}",
-            "Censo Argentino",
-            Qgis.Info,
-        )
         if failed_variables:
             QgsMessageLog.logMessage(
                 f"Variables con errores de categoría: {failed_variables}",
                 "Censo Argentino",
                 Qgis.Warning,
             )
-        QgsMessageLog.logMessage(f"Consulta completa:\n{query}", "Censo Argentino", Qgis.Info)
+
+        # Detalle de la consulta solo en modo depuración: el SQL completo ocupa
+        # varios KB y ya queda en la pestaña Registro y en la propiedad censo_query
+        if DEBUG_LOGGING:
+            QgsMessageLog.logMessage(
+                "=== DEBUG DE CONSULTA CENSO ===", "Censo Argentino", Qgis.Info
+            )
+            QgsMessageLog.logMessage(f"Nivel Geográfico: {geo_level}", "Censo Argentino", Qgis.Info)
+            QgsMessageLog.logMessage(
+                f"Códigos de variables: {variable_codes}", "Censo Argentino", Qgis.Info
+            )
+            QgsMessageLog.logMessage(
+                f"Total de columnas expandidas: {total_columns}", "Censo Argentino", Qgis.Info
+            )
+            QgsMessageLog.logMessage(
+                f"Filtros geográficos: {geo_filters if geo_filters else 'Ninguno'}",
+                "Censo Argentino",
+                Qgis.Info,
+            )
+            if bbox:
+                QgsMessageLog.logMessage(f"Filtro bbox: {bbox}", "Censo Argentino", Qgis.Info)
+            QgsMessageLog.logMessage(
+                f"Parámetros de consulta: {query_params}", "Censo Argentino", Qgis.Info
+            )
+            QgsMessageLog.logMessage(
+                f"Filtro geográfico SQL: {geo_filter if geo_filter else 'Ninguno'}",
+                "Censo Argentino",
+                Qgis.Info,
+            )
+            QgsMessageLog.logMessage(
+                f"Filtro espacial SQL: {spatial_filter if spatial_filter else 'Ninguno'}",
+                "Censo Argentino",
+                Qgis.Info,
+            )
+            QgsMessageLog.logMessage(f"Consulta completa:\n{query}", "Censo Argentino", Qgis.Info)
 
         # Pass query to callback for Query Log tab (substitute parameters for readability)
         if progress_callback:
@@ -808,14 +1202,13 @@ def load_census_layer(
         if progress_callback:
             progress_callback(30, "Ejecutando consulta...")
 
-        result = con.execute(query, query_params).fetchall()
+        check_cancelled(is_cancelled)
+        con.execute(query, query_params)
+        # Transmitir el resultado por lotes: la memoria pico queda acotada al lote
+        # en vez de materializar todas las geometrías de una vez
+        batch = con.fetchmany(FETCH_BATCH_SIZE)
 
-        if progress_callback:
-            progress_callback(60, f"La consulta devolvió {len(result)} filas...")
-
-        # Don't close - keep connection alive in pool
-
-        if not result:
+        if not batch:
             error_msg = "No se devolvieron datos para los filtros seleccionados."
             if bbox:
                 error_msg += f" Intente alejar el zoom o deshabilite el filtro de ventana. Bbox usado: {bbox}"
@@ -829,7 +1222,7 @@ def load_census_layer(
             raise Exception(error_msg)
 
         if progress_callback:
-            progress_callback(70, "Creando capa...")
+            progress_callback(60, "Creando capa...")
 
         # Create layer name with variable list and year
         if len(variable_codes) == 1:
@@ -850,47 +1243,66 @@ def load_census_layer(
         provider.addAttributes(fields)
         layer.updateFields()
 
-        if progress_callback:
-            progress_callback(75, f"Procesando {len(result)} entidades...")
-
-        # Add features
-        features = []
-        total_rows = len(result)
-        for idx, row in enumerate(result):
-            feature = QgsFeature()
-
-            # Row format: (geo_id, wkt, col1, col2, col3, ...)
-            geo_id = row[0]
-            wkt = row[1]
-
-            # Parse geometry from WKT (converted by ST_AsText)
-            geom = QgsGeometry.fromWkt(wkt)
+        # Entidades creadas con el esquema de la capa: no hay que reajustar
+        # el vector de atributos al insertarlas
+        layer_fields = layer.fields()
 
-            if geom.isNull():
-                raise Exception(f"Geometría inválida para entidad {geo_id}")
+        # Add features batch by batch, en un único modo de actualización del
+        # proveedor; la extensión se recalcula una sola vez al final
+        feature_count = 0
+        invalid_geo_ids = []  # Entidades sin geometría válida: se omiten y se informan al final
 
-            feature.setGeometry(geom)
+        # Nombres resueltos una vez fuera del bucle: cada fila evita las
+        # búsquedas de atributos y globales de CPython
+        new_geometry = QgsGeometry
+        new_feature = QgsFeature
+        add_features = provider.addFeatures
+        fast_insert = QgsFeatureSink.FastInsert
 
-            # Set attributes: geo_id + all category column values
-            attributes = [geo_id]
-            # Column values start at index 2 (after geo_id and wkt)
-            for col_idx in range(len(column_names)):
-                val = row[2 + col_idx]
-                # Handle NULL values
-                attributes.append(float(val) if val is not None else None)
-
-            feature.setAttributes(attributes)
-            features.append(feature)
+        provider.enterUpdateMode()
+        try:
+            while batch:
+                features = []
+                append_feature = features.append
+                # Row format: (geo_id, wkb, col1, col2, col3, ...)
+                for geo_id, wkb, *values in batch:
+                    # Geometría binaria 2D (ST_AsWKB + ST_Force2D): menos bytes, sin
+                    # parseo de texto ni coordenadas Z/M que la capa Polygon descarta
+                    geom = new_geometry()
+                    geom.fromWkb(wkb)
+
+                    if geom.isNull():
+                        invalid_geo_ids.append(geo_id)
+                        continue
+
+                    feature = new_feature(layer_fields)
+                    feature.setGeometry(geom)
+                    # geo_id + all category column values (ya DOUBLE desde SQL; NULL -> None)
+                    feature.setAttributes([geo_id, *values])
+                    append_feature(feature)
+
+                # FastInsert: el proveedor no devuelve IDs actualizados a las entidades
+                add_features(features, fast_insert)
+                feature_count += len(features)
+
+                # El total no se conoce hasta agotar el resultado: avanzar sin pasar de 95
+                if progress_callback:
+                    percent = min(95, 60 + feature_count // FETCH_BATCH_SIZE * 5)
+                    progress_callback(percent, f"Procesando entidades: {feature_count}...")
 
-            # Update progress more frequently for better feedback
-            if progress_callback and (idx % 50 == 0 or idx == total_rows - 1):
-                percent = 75 + int((idx / total_rows) * 20)
-                progress_callback(percent, f"Procesando entidades: {idx + 1}/{total_rows}")
+                check_cancelled(is_cancelled)
+                batch = con.fetchmany(FETCH_BATCH_SIZE)
+        finally:
+            provider.leaveUpdateMode()
 
-        if progress_callback:
-            progress_callback(96, "Agregando entidades a la capa...")
-
-        provider.addFeatures(features)
+        if invalid_geo_ids:
+            QgsMessageLog.logMessage(
+                f"Se omitieron {len(invalid_geo_ids)} entidades con geometría inválida: "
+                f"{', '.join(str(geo_id) for geo_id in invalid_geo_ids[:20])}"
+                f"{'...' if len(invalid_geo_ids) > 20 else ''}",
+                "Censo Argentino",
+                Qgis.Warning,
+            )
 
         if progress_callback:
             progress_callback(98, "Actualizando extensiones de la capa...")
@@ -901,7 +1313,7 @@ def load_census_layer(
             progress_callback(100, "Capa cargada exitosamente")
 
         QgsMessageLog.logMessage(
-            f"Se cargaron exitosamente {len(features)} entidades con {len(variable_codes)} variables "
+            f"Se cargaron exitosamente {feature_count} entidades con {len(variable_codes)} variables "
             f"({total_columns} columnas expandidas)",
             "Censo Argentino",
             Qgis.Info,
@@ -914,6 +1326,31 @@ def load_census_layer(
 
     except Exception as e:
         raise Exception(f"Error cargando capa censal: {str(e)}")
+    finally:
+        if con is not None:
+            con.close()
+
+
+# Columnas binarias (BLOB) que se interpretan como geometría WKB en consultas SQL
+WKB_COLUMN_NAMES = ("wkb", "geom", "geometry")
+
+
+def find_geometry_column(description):
+    """Ubicar la columna de geometría en la descripción de un resultado DuckDB.
+
+    Una columna de texto llamada wkt tiene prioridad; si no hay, se acepta una
+    columna BLOB llamada wkb, geom o geometry (por ejemplo ST_AsWKB(...) as wkb).
+
+    Returns:
+        (índice, es_wkb), o (None, False) si el resultado no tiene geometría
+    """
+    for idx, (name, *_rest) in enumerate(description):
+        if name == "wkt":
+            return idx, False
+    for idx, (name, type_code, *_rest) in enumerate(description):
+        if name.lower() in WKB_COLUMN_NAMES and type_code == "BLOB":
+            return idx, True
+    return None, False
 
 
 def run_custom_query(sql, year="2022", progress_callback=None):
@@ -934,24 +1371,23 @@ def run_custom_query(sql, year="2022", progress_callback=None):
     """
     config = CENSUS_CONFIG[year]
 
+    con = None
     try:
         if progress_callback:
             progress_callback(10, "Conectando a fuente de datos...")
 
-        con = _connection_pool.get_connection(load_extensions=True)
+        # Cursor propio sobre la conexión compartida (extensiones ya cargadas)
+        con = _connection_pool.cursor(load_extensions=True)
 
         if progress_callback:
             progress_callback(20, f"Creando vistas de tablas para censo {year}...")
 
-        # Drop views if they exist (in case year changed)
-        con.execute(
-            "DROP VIEW IF EXISTS radios; DROP VIEW IF EXISTS census; DROP VIEW IF EXISTS metadata;"
-        )
-
+        # Vistas temporales: viven solo en este cursor, así consultas de distintos
+        # años o hilos no se pisan las definiciones
         con.execute(f"""
-            CREATE VIEW radios AS SELECT * FROM '{config["urls"]["radios"]}';
-            CREATE VIEW census AS SELECT * FROM '{config["urls"]["census"]}';
-            CREATE VIEW metadata AS SELECT * FROM '{config["urls"]["metadata"]}';
+            CREATE TEMP VIEW radios AS SELECT * FROM '{config["urls"]["radios"]}';
+            CREATE TEMP VIEW census AS SELECT * FROM '{config["urls"]["census"]}';
+            CREATE TEMP VIEW metadata AS SELECT * FROM '{config["urls"]["metadata"]}';
         """)  # nosec B608
 
         if progress_callback:
@@ -959,8 +1395,14 @@ def run_custom_query(sql, year="2022", progress_callback=None):
 
         result_rel = con.execute(sql)
         columns = [desc[0] for desc in result_rel.description]
-        rows = result_rel.fetchall()
-        # Don't close - keep connection alive in pool
+        geom_idx, geom_is_wkb = find_geometry_column(result_rel.description)
+
+        # Con geometría el resultado se consume por lotes directo a la capa,
+        # sin materializar todas las filas; la vista de tabla sí necesita todas
+        if geom_idx is not None:
+            rows = result_rel.fetchmany(FETCH_BATCH_SIZE)
+        else:
+            rows = result_rel.fetchall()
 
         if not rows:
             return None, "La consulta no devolvió resultados"
@@ -968,82 +1410,131 @@ def run_custom_query(sql, year="2022", progress_callback=None):
         if progress_callback:
             progress_callback(50, "Procesando resultados...")
 
-        # Check if result has geometry (wkt column)
-        if "wkt" in columns:
-            layer = _result_to_layer(columns, rows, progress_callback)
+        if geom_idx is not None:
+            layer = _result_to_layer(
+                result_rel.description,
+                geom_idx,
+                geom_is_wkb,
+                rows,
+                result_rel.fetchmany,
+                progress_callback,
+            )
             return layer, None
         else:
             return (columns, rows), None
 
     except Exception as e:
         return None, str(e)
+    finally:
+        if con is not None:
+            con.close()
+
+
+# Tipos DuckDB cuyos valores llegan a Python como int o float; el resto se guarda como texto
+INTEGER_DUCKDB_TYPES = {
+    "BOOLEAN",
+    "TINYINT",
+    "SMALLINT",
+    "INTEGER",
+    "BIGINT",
+    "HUGEINT",
+    "UTINYINT",
+    "USMALLINT",
+    "UINTEGER",
+    "UBIGINT",
+    "UHUGEINT",
+}
+FLOAT_DUCKDB_TYPES = {"FLOAT", "DOUBLE"}
+
+
+def field_type_for_duckdb_type(type_code):
+    """Tipo QVariant del campo de capa para un tipo de columna DuckDB (description[i][1])"""
+    type_name = str(type_code)
+    if type_name in INTEGER_DUCKDB_TYPES:
+        return QVariant.LongLong
+    if type_name in FLOAT_DUCKDB_TYPES:
+        return QVariant.Double
+    return QVariant.String
+
+
+def _result_to_layer(description, geom_idx, geom_is_wkb, rows, fetch_batch, progress_callback=None):
+    """Convertir resultado de consulta con columna de geometría a QgsVectorLayer
 
-
-def _result_to_layer(columns, rows, progress_callback=None):
-    """Convertir resultado de consulta con columna wkt a QgsVectorLayer"""
+    Args:
+        description: Descripción del cursor DuckDB (nombre y tipo de cada columna)
+        geom_idx: Índice de la columna de geometría (ver find_geometry_column)
+        geom_is_wkb: True si la geometría llega como WKB binario, False si es WKT
+        rows: Primer lote de filas
+        fetch_batch: Función que devuelve el siguiente lote (p. ej. fetchmany);
+            lista vacía al agotarse el resultado
+        progress_callback: Función opcional (percent, message)
+    """
     from qgis.core import Qgis, QgsMessageLog
 
     layer = QgsVectorLayer("Polygon?crs=EPSG:4326", "Resultado de Consulta SQL", "memory")
     provider = layer.dataProvider()
 
-    # Find wkt column index
-    wkt_idx = columns.index("wkt")
-
-    # Build fields from non-geometry columns
-    fields = []
-    non_wkt_indices = []
-    for idx, col in enumerate(columns):
-        if col == "wkt":
-            continue
-        non_wkt_indices.append(idx)
-
-        # Infer type from first non-NULL value
-        sample_val = None
-        for row in rows:
-            if row[idx] is not None:
-                sample_val = row[idx]
-                break
-
-        if sample_val is not None:
-            if isinstance(sample_val, int):
-                fields.append(QgsField(col, QVariant.LongLong))
-            elif isinstance(sample_val, float):
-                fields.append(QgsField(col, QVariant.Double))
-            else:
-                fields.append(QgsField(col, QVariant.String))
-        else:
-            # Default to String if all values are NULL
-            fields.append(QgsField(col, QVariant.String))
+    # Build fields from non-geometry columns: el tipo sale del esquema del
+    # resultado, no de los valores, así una columna que empieza con NULL
+    # conserva su tipo numérico
+    fields = [
+        QgsField(name, field_type_for_duckdb_type(type_code))
+        for idx, (name, type_code, *_rest) in enumerate(description)
+        if idx != geom_idx
+    ]
 
     provider.addAttributes(fields)
     layer.updateFields()
+    # Entidades creadas con el esquema de la capa (vector de atributos ya dimensionado)
+    layer_fields = layer.fields()
 
     if progress_callback:
-        progress_callback(60, f"Agregando {len(rows)} entidades...")
+        progress_callback(60, "Agregando entidades...")
 
-    features = []
+    feature_count = 0
 
-    for idx, row in enumerate(rows):
-        feature = QgsFeature()
-        geom = QgsGeometry.fromWkt(row[wkt_idx])
-        if not geom.isNull():
-            feature.setGeometry(geom)
-            feature.setAttributes([row[i] for i in non_wkt_indices])
-            features.append(feature)
+    # Recorrer por lotes: cada lote se entrega al proveedor antes de pedir el
+    # siguiente al cursor, así nunca hay más de FETCH_BATCH_SIZE filas en memoria
+    while rows:
+        features = []
+        for row in rows:
+            geom_value = row[geom_idx]
+            if geom_value is None:
+                continue
+            if geom_is_wkb:
+                # WKB binario: decodificación directa, sin parseo de texto
+                geom = QgsGeometry()
+                geom.fromWkb(geom_value)
+            else:
+                geom = QgsGeometry.fromWkt(geom_value)
+            if not geom.isNull():
+                feature = QgsFeature(layer_fields)
+                feature.setGeometry(geom)
+                # Atributos en el orden de los campos: la fila sin la columna de
+                # geometría (copia y borrado posicional en C, sin indexar columna por columna)
+                attributes = list(row)
+                del attributes[geom_idx]
+                feature.setAttributes(attributes)
+                features.append(feature)
+
+        # FastInsert: el proveedor no devuelve IDs actualizados a las entidades
+        provider.addFeatures(features, QgsFeatureSink.FastInsert)
+        feature_count += len(features)
+
+        # El total no se conoce hasta agotar el resultado: avanzar sin pasar de 95
+        if progress_callback:
+            percent = min(95, 60 + feature_count // FETCH_BATCH_SIZE * 5)
+            progress_callback(percent, f"Procesando entidades: {feature_count}...")
 
-        # Update progress
-        if progress_callback and idx % 50 == 0:
-            percent = 60 + int((idx / len(rows)) * 35)
-            progress_callback(percent, f"Procesando entidades: {idx + 1}/{len(rows)}")
+        rows = fetch_batch(FETCH_BATCH_SIZE)
 
-    provider.addFeatures(features)
     layer.updateExtents()
 
     if progress_callback:
         progress_callback(100, "Listo")
 
     QgsMessageLog.logMessage(
-        f"Consulta SQL creó capa con {len(features)} entidades", "Censo Argentino", Qgis.Info
+        f"Consulta SQL creó capa con {feature_count} entidades", "Censo Argentino", Qgis.Info
     )
 
     return layer
@@ -1,5 +1,8 @@
 """Funciones de construcción de consultas extraídas de query.py para facilitar pruebas."""
 
+import re
+import unicodedata
+
 
 def build_geo_filter(geo_level, geo_filters, geo_id_col="COD_2022"):
     """
@@ -75,30 +78,111 @@ def build_geo_filter(geo_level, geo_filters, geo_id_col="COD_2022"):
 
 def build_spatial_filter(bbox, geometry_column="geometry"):
     """
-    Construir fragmento SQL de filtro de bounding box espacial.
+    Construir fragmento SQL de filtro de bounding box espacial y sus parámetros.
 
     GeoParquet 2.0 usa tipos GEOMETRY nativos de Parquet con estadísticas
     espaciales integradas. DuckDB automáticamente hace predicate pushdown
     del filtro ST_Intersects sin necesidad de columna bbox separada.
 
+    Antes del ST_Intersects exacto se evalúa ST_Intersects_Extent, que solo
+    compara cajas envolventes: los polígonos lejos del bbox se descartan sin
+    pasar por el predicado geométrico completo.
+
     Args:
         bbox: Tupla de (xmin, ymin, xmax, ymax) en EPSG:4326
         geometry_column: Nombre de la columna de geometría (default "geometry")
 
     Returns:
-        str: Fragmento SQL con condición ST_Intersects, o string vacío si bbox es None
+        tuple: (spatial_filter, spatial_params)
+            spatial_filter: SQL con ST_Intersects_Extent y ST_Intersects contra
+                ST_MakeEnvelope(?, ?, ?, ?)
+            spatial_params: [xmin, ymin, xmax, ymax] como floats, una vez por envolvente
+            Filtro vacío y lista vacía si bbox es None
     """
     if not bbox:
-        return ""
+        return "", []
 
     xmin, ymin, xmax, ymax = bbox
+    envelope_params = [float(xmin), float(ymin), float(xmax), float(ymax)]
 
-    # DuckDB spatial doesn't support SRID parameter in ST_GeomFromText
-    # Con GeoParquet 2.0, DuckDB hace pushdown automático via estadísticas nativas
-    bbox_wkt = (
-        f"POLYGON(({xmin} {ymin}, {xmax} {ymin}, {xmax} {ymax}, {xmin} {ymax}, {xmin} {ymin}))"
+    # Envolvente parametrizada: sin parseo de WKT ni coordenadas interpoladas en el SQL
+    envelope = "ST_MakeEnvelope(?, ?, ?, ?)"
+    spatial_filter = (
+        f" AND ST_Intersects_Extent({geometry_column}, {envelope})"
+        f" AND ST_Intersects({geometry_column}, {envelope})"
     )
-    return f" AND ST_Intersects({geometry_column}, ST_GeomFromText('{bbox_wkt}'))"
+    return spatial_filter, envelope_params * 2
+
+
+def sanitize_category_label(label):
+    """
+    Convert category label to valid QGIS field name.
+
+    NO LENGTH TRUNCATION - Full names for modern GIS formats.
+    Shapefile users should export to GeoPackage or GeoParquet instead.
+
+    Rules:
+    - Lowercase only
+    - Underscores for spaces/hyphens
+    - Remove accents and special characters
+    - Must start with letter (prefix with 'cat_' if starts with digit)
+
+    Args:
+        label: Original category label (e.g., "Sin instrucción")
+
+    Returns:
+        Sanitized field name (e.g., "sin_instruccion")
+
+    Examples:
+        >>> sanitize_category_label("Sin instrucción")
+        'sin_instruccion'
+        >>> sanitize_category_label("0-14 años")
+        'cat_0_14_anos'
+        >>> sanitize_category_label("Primario completo")
+        'primario_completo'
+    """
+    if not label:
+        return "unknown"
+
+    # Remove accents/diacritics
+    label = unicodedata.normalize("NFKD", label).encode("ASCII", "ignore").decode()
+
+    # Convert to lowercase
+    label = label.lower()
+
+    # Replace spaces, hyphens, and slashes with underscores
+    label = label.replace(" ", "_").replace("-", "_").replace("/", "_")
+
+    # Remove non-alphanumeric except underscores
+    label = re.sub(r"[^a-z0-9_]", "", label)
+
+    # Remove consecutive underscores
+    label = re.sub(r"_+", "_", label)
+
+    # Remove leading/trailing underscores
+    label = label.strip("_")
+
+    # Ensure starts with letter
+    if label and label[0].isdigit():
+        label = "cat_" + label
+
+    return label or "unknown"
+
+
+def quote_identifier(name):
+    """Citar un nombre de columna para SQL escapando comillas dobles internas.
+
+    Ejemplo:
+        >>> quote_identifier('var"x_total')
+        '"var""x_total"'
+    """
+    escaped = name.replace('"', '""')
+    return f'"{escaped}"'
+
+
+def extract_pivot_column_names(pivot_sql):
+    """Recuperar los nombres de columna (sin citar) de la salida de build_pivot_columns."""
+    return [name.replace('""', '"') for name in re.findall(r'as "((?:[^"]|"")+)"', pivot_sql)]
 
 
 def build_pivot_columns(variable_codes, variable_categories_map):
@@ -121,38 +205,23 @@ def build_pivot_columns(variable_codes, variable_categories_map):
             }
 
     Returns:
-        str: Definiciones de columnas SQL separadas por comas para pivoteo CTE
+        tuple: (pivot_sql, pivot_params)
+            pivot_sql: Definiciones de columnas SQL separadas por comas para pivoteo CTE
+            pivot_params: códigos de variable y valores de categoría, en el orden
+                de sus placeholders ? dentro de pivot_sql
 
     Ejemplo de salida:
-        "SUM(CASE WHEN codigo_variable = 'EDUCACION' AND valor_categoria = '1'
-              THEN conteo ELSE 0 END) as \"educacion_sin_instruccion\",
-         SUM(CASE WHEN codigo_variable = 'EDUCACION' AND valor_categoria = '2'
-              THEN conteo ELSE 0 END) as \"educacion_primario_incompleto\",
-         SUM(CASE WHEN codigo_variable = 'EDUCACION' AND valor_categoria IS NULL
-              THEN conteo ELSE 0 END) as \"educacion_null\""
+        ("SUM(CASE WHEN codigo_variable = ? AND valor_categoria = ?
+               THEN conteo ELSE 0 END) as \"educacion_sin_instruccion\",
+          SUM(CASE WHEN codigo_variable = ? AND valor_categoria IS NULL
+               THEN conteo ELSE 0 END) as \"educacion_null\"",
+         ['EDUCACION', '1', 'EDUCACION'])
     """
-    # Try to import sanitize_category_label
-    try:
-        from query import sanitize_category_label
-    except ImportError:
-        # Fallback if query module not available (for testing)
-        import re
-        import unicodedata
-
-        def sanitize_category_label(label):
-            if not label:
-                return "unknown"
-            label = unicodedata.normalize("NFKD", label).encode("ASCII", "ignore").decode()
-            label = label.lower()
-            label = label.replace(" ", "_").replace("-", "_").replace("/", "_")
-            label = re.sub(r"[^a-z0-9_]", "", label)
-            label = re.sub(r"_+", "_", label)
-            label = label.strip("_")
-            if label and label[0].isdigit():
-                label = "cat_" + label
-            return label or "unknown"
-
     pivot_cols = []
+    # Códigos y valores viajan como parámetros; los alias (que llevan el código
+    # de variable) se citan con quote_identifier, así nada del catálogo puede
+    # cerrar un identificador en el texto SQL
+    pivot_params = []
 
     for var_code in variable_codes:
         cat_data = variable_categories_map.get(var_code, {"categories": [], "has_nulls": False})
@@ -163,11 +232,9 @@ def build_pivot_columns(variable_codes, variable_categories_map):
         if not categories and not has_nulls:
             # No categories - create single total column (fallback behavior)
             col_name = f"{var_code.lower()}_total"
-            case_stmt = (
-                f"SUM(CASE WHEN codigo_variable = '{var_code}' "
-                f'THEN conteo ELSE 0 END) as "{col_name}"'
-            )
+            case_stmt = f"SUM(CASE WHEN codigo_variable = ? THEN conteo ELSE 0 END) as {quote_identifier(col_name)}"
             pivot_cols.append(case_stmt)
+            pivot_params.append(var_code)
             continue
 
         # Regular categories
@@ -178,28 +245,28 @@ def build_pivot_columns(variable_codes, variable_categories_map):
 
             # Build CASE statement
             case_stmt = (
-                f"SUM(CASE WHEN codigo_variable = '{var_code}' "
-                f"AND valor_categoria = '{valor}' "
-                f'THEN conteo ELSE 0 END) as "{col_name}"'
+                "SUM(CASE WHEN codigo_variable = ? "
+                "AND valor_categoria = ? "
+                f"THEN conteo ELSE 0 END) as {quote_identifier(col_name)}"
             )
             pivot_cols.append(case_stmt)
+            pivot_params.extend([var_code, valor])
 
         # DESIGN DECISION #3: Add NULL category column if exists
         if has_nulls:
             col_name = f"{var_code.lower()}_null"
             case_stmt = (
-                f"SUM(CASE WHEN codigo_variable = '{var_code}' "
-                f"AND valor_categoria IS NULL "
-                f'THEN conteo ELSE 0 END) as "{col_name}"'
+                "SUM(CASE WHEN codigo_variable = ? "
+                "AND valor_categoria IS NULL "
+                f"THEN conteo ELSE 0 END) as {quote_identifier(col_name)}"
             )
             pivot_cols.append(case_stmt)
+            pivot_params.append(var_code)
 
         # Add total column for this variable (sum of all categories including NULLs)
         col_name = f"{var_code.lower()}_total"
-        case_stmt = (
-            f"SUM(CASE WHEN codigo_variable = '{var_code}' "
-            f'THEN conteo ELSE 0 END) as "{col_name}"'
-        )
+        case_stmt = f"SUM(CASE WHEN codigo_variable = ? THEN conteo ELSE 0 END) as {quote_identifier(col_name)}"
         pivot_cols.append(case_stmt)
+        pivot_params.append(var_code)
 
-    return ",\n        ".join(pivot_cols)
+    return ",\n        ".join(pivot_cols), pivot_params
@@ -0,0 +1,58 @@
+"""Índice de trigramas para filtrar listas largas sin recorrerlas en cada tecla."""
+
+from collections import defaultdict
+
+TRIGRAM_SIZE = 3
+
+
+def build_trigram_index(texts):
+    """
+    Construir índice invertido de trigramas sobre una lista de textos.
+
+    Args:
+        texts: Lista de strings ya normalizados en minúsculas, en el mismo
+            orden que las filas de la lista a filtrar
+
+    Returns:
+        dict: Trigrama -> set de posiciones de fila que lo contienen
+    """
+    index = defaultdict(set)
+    for row, text in enumerate(texts):
+        for start in range(len(text) - TRIGRAM_SIZE + 1):
+            index[text[start : start + TRIGRAM_SIZE]].add(row)
+    return dict(index)
+
+
+def search_trigram_index(index, texts, query):
+    """
+    Buscar las filas cuyo texto contiene query usando el índice de trigramas.
+
+    Args:
+        index: Índice construido con build_trigram_index
+        texts: Misma lista de textos usada para construir el índice
+        query: Texto buscado (se compara en minúsculas)
+
+    Returns:
+        set de posiciones de fila que contienen query, o None si query es más
+        corto que un trigrama (el llamador debe usar búsqueda lineal)
+    """
+    query = query.lower()
+    if len(query) < TRIGRAM_SIZE:
+        return None
+
+    trigrams = {
+        query[start : start + TRIGRAM_SIZE] for start in range(len(query) - TRIGRAM_SIZE + 1)
+    }
+    row_sets = []
+    for trigram in trigrams:
+        rows = index.get(trigram)
+        if not rows:
+            return set()
+        row_sets.append(rows)
+
+    # Intersectar empezando por el conjunto más chico
+    row_sets.sort(key=len)
+    candidates = row_sets[0].intersection(*row_sets[1:])
+
+    # Los trigramas no garantizan contigüidad: verificar cada candidato
+    return {row for row in candidates if query in texts[row]}
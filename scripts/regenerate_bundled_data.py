@@ -116,7 +116,13 @@ def regenerate_geocodes():
     output_path = OUTPUT_DIR / "geocodes.parquet"
 
     print(f"Descargando geocodes de {len(YEARS)} años...")
-    con.execute(f"COPY ({query}) TO '{output_path}' (FORMAT PARQUET)")
+    # Ordenar por (year, level, code): cada lectura del plugin filtra por año y
+    # nivel, así las filas quedan contiguas (estadísticas min/max útiles por row
+    # group) y el ORDER BY code de get_geographic_codes recibe datos ya ordenados
+    con.execute(
+        f"COPY (SELECT * FROM ({query}) ORDER BY year, level, code) "
+        f"TO '{output_path}' (FORMAT PARQUET)"
+    )
 
     result = con.execute(f"""
         SELECT year, level, COUNT(*) as count
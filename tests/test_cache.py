@@ -5,7 +5,9 @@ import json
 # Import functions to test
 import sys
 from pathlib import Path
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
+
+import pytest
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from censo_argentino_qgis.query import get_cache_dir, get_cached_data, save_cached_data
@@ -26,6 +28,13 @@ class TestGetCacheDir:
             assert cache_dir.exists()
             assert cache_dir.is_dir()
 
+    def test_mkdir_runs_once_per_directory(self, temp_cache_dir):
+        """Llamadas repetidas no deben volver a crear el directorio."""
+        with patch("censo_argentino_qgis.query.Path.home", return_value=temp_cache_dir):
+            first = get_cache_dir()
+            with patch("censo_argentino_qgis.query.Path.mkdir", side_effect=AssertionError):
+                assert get_cache_dir() == first
+
     def test_directory_name_is_correct(self, temp_cache_dir):
         """Cache directory should be named 'qgis-censo-argentino'."""
         with patch("censo_argentino_qgis.query.Path.home", return_value=temp_cache_dir):
@@ -134,3 +143,254 @@ class TestSaveCachedData:
                 save_cached_data("readonly", {"data": "test"})
         finally:
             temp_cache_dir.chmod(0o755)  # Restore permissions
+
+
+@pytest.fixture
+def empty_lookup_memo():
+    """Vaciar la memoización en proceso antes y después de cada test."""
+    from censo_argentino_qgis import query
+
+    query._lookup_memo.clear()
+    yield query._lookup_memo
+    query._lookup_memo.clear()
+
+
+@pytest.mark.usefixtures("empty_lookup_memo")
+class TestLookupDiskCache:
+    """Tests para el caché en disco de variables, códigos y metadatos empaquetados."""
+
+    def test_get_variables_hits_cache_without_duckdb(self, temp_cache_dir):
+        """La segunda llamada debe resolverse desde disco sin abrir DuckDB."""
+        from censo_argentino_qgis import query
+        from censo_argentino_qgis.query import get_variables
+
+        with patch("censo_argentino_qgis.query.get_cache_dir", return_value=temp_cache_dir):
+            first = get_variables(year="2022", entity_type="HOGAR")
+            query._lookup_memo.clear()
+            with patch.object(query._connection_pool, "cursor", side_effect=AssertionError):
+                second = get_variables(year="2022", entity_type="HOGAR")
+
+        assert first
+        assert second == first
+        assert all(isinstance(row, tuple) for row in second)
+
+    def test_get_geographic_codes_hits_cache_without_duckdb(self, temp_cache_dir):
+        """Los códigos geográficos también se sirven desde disco tras la primera consulta."""
+        from censo_argentino_qgis import query
+        from censo_argentino_qgis.query import get_geographic_codes
+
+        with patch("censo_argentino_qgis.query.get_cache_dir", return_value=temp_cache_dir):
+            first = get_geographic_codes(year="2022", geo_level="PROV")
+            query._lookup_memo.clear()
+            with patch.object(query._connection_pool, "cursor", side_effect=AssertionError):
+                second = get_geographic_codes(year="2022", geo_level="PROV")
+
+        assert len(first) == 24
+        assert second == first
+
+    def test_preload_all_metadata_feeds_category_lookup(self, temp_cache_dir):
+        """preload_all_metadata debe dejar en caché lo que lee get_variable_categories."""
+        from censo_argentino_qgis import query
+        from censo_argentino_qgis.query import get_variable_categories, preload_all_metadata
+
+        with patch("censo_argentino_qgis.query.get_cache_dir", return_value=temp_cache_dir):
+            metadata = preload_all_metadata(year="2022")
+            var_code = next(code for code, data in metadata.items() if data["categories"])
+            query._lookup_memo.clear()
+            with patch.object(query._connection_pool, "cursor", side_effect=AssertionError):
+                cached_metadata = preload_all_metadata(year="2022")
+                categories = get_variable_categories(year="2022", variable_code=var_code)
+
+        assert cached_metadata == metadata
+        assert [tuple(c) for c in categories["categories"]] == metadata[var_code]["categories"]
+
+    def test_category_lookup_memoizes_disk_metadata(self, temp_cache_dir):
+        """Tras leer el mapa de metadatos del disco, las búsquedas siguientes no lo releen."""
+        from censo_argentino_qgis import query
+        from censo_argentino_qgis.query import get_variable_categories, preload_all_metadata
+
+        with patch("censo_argentino_qgis.query.get_cache_dir", return_value=temp_cache_dir):
+            metadata = preload_all_metadata(year="2022")
+            var_codes = [code for code, data in metadata.items() if data["categories"]][:2]
+            query._lookup_memo.clear()
+            first = get_variable_categories(year="2022", variable_code=var_codes[0])
+            with patch("censo_argentino_qgis.query.get_cached_data", side_effect=AssertionError):
+                second = get_variable_categories(year="2022", variable_code=var_codes[1])
+
+        assert first == metadata[var_codes[0]]
+        assert second == metadata[var_codes[1]]
+
+    def test_cache_key_tracks_bundled_file_version(self):
+        """La firma del archivo empaquetado debe formar parte de la clave de caché."""
+        from censo_argentino_qgis.query import bundled_data_version
+
+        version = bundled_data_version("metadata.parquet")
+        assert version == bundled_data_version("metadata.parquet")
+        assert "_" in version
+
+
+@pytest.mark.usefixtures("empty_lookup_memo")
+class TestLookupMemo:
+    """Tests para la memoización en proceso de las búsquedas de metadatos."""
+
+    def test_memoized_lookup_empty_before_first_call(self):
+        """Sin consulta previa no hay resultado memorizado."""
+        from censo_argentino_qgis.query import get_variables, memoized_lookup
+
+        assert memoized_lookup(get_variables, "2022", "HOGAR") is None
+
+    def test_repeat_call_skips_disk_cache(self, temp_cache_dir):
+        """Una llamada repetida no debe leer el caché en disco."""
+        from censo_argentino_qgis.query import get_variables, memoized_lookup
+
+        with patch("censo_argentino_qgis.query.get_cache_dir", return_value=temp_cache_dir):
+            first = get_variables(year="2022", entity_type="VIVIENDA")
+            with patch("censo_argentino_qgis.query.get_cached_data", side_effect=AssertionError):
+                second = get_variables(year="2022", entity_type="VIVIENDA")
+
+        assert second == first
+        assert memoized_lookup(get_variables, "2022", "VIVIENDA") == first
+
+    def test_returned_list_is_a_copy(self, temp_cache_dir):
+        """Modificar el resultado no debe alterar lo memorizado."""
+        from censo_argentino_qgis.query import get_geographic_codes
+
+        with patch("censo_argentino_qgis.query.get_cache_dir", return_value=temp_cache_dir):
+            first = get_geographic_codes(year="2022", geo_level="PROV")
+            first.clear()
+            second = get_geographic_codes(year="2022", geo_level="PROV")
+
+        assert len(second) == 24
+
+    def test_returned_metadata_map_is_a_copy(self, temp_cache_dir):
+        """Modificar el mapa de metadatos recibido no debe alterar lo memorizado."""
+        from censo_argentino_qgis.query import memoized_lookup, preload_all_metadata
+
+        with patch("censo_argentino_qgis.query.get_cache_dir", return_value=temp_cache_dir):
+            preload_all_metadata(year="2022").clear()
+
+        memoized = memoized_lookup(preload_all_metadata, "2022")
+        assert memoized
+        memoized.clear()
+        assert memoized_lookup(preload_all_metadata, "2022")
+
+    def test_initial_data_matches_individual_lookups(self, temp_cache_dir):
+        """get_initial_data debe devolver lo mismo que las búsquedas por separado."""
+        from censo_argentino_qgis.query import get_initial_data, get_variables, memoized_lookup
+
+        assert memoized_lookup(get_initial_data, "2022", "HOGAR") is None
+        with patch("censo_argentino_qgis.query.get_cache_dir", return_value=temp_cache_dir):
+            metadata_map, variables = get_initial_data(year="2022", entity_type="HOGAR")
+            assert variables == get_variables(year="2022", entity_type="HOGAR")
+
+        assert memoized_lookup(get_variables, "2022", "HOGAR") == variables
+        assert variables[0][0] in metadata_map
+        # El diálogo puede entregar los datos iniciales sin pasar por el pool
+        assert memoized_lookup(get_initial_data, "2022", "HOGAR") == (metadata_map, variables)
+
+
+class TestDissolvedCache:
+    """Tests para el caché local de geometrías disueltas por nivel."""
+
+    def test_path_depends_on_level_and_source_version(self, temp_cache_dir):
+        """Un archivo por año y nivel; una versión nueva de la fuente usa otro."""
+        from censo_argentino_qgis.query import _dissolved_cache_path
+
+        with patch("censo_argentino_qgis.query.get_cache_dir", return_value=temp_cache_dir):
+            base = _dissolved_cache_path("2022", "PROV", "100-1700000000")
+            assert base == _dissolved_cache_path("2022", "PROV", "100-1700000000")
+            assert base != _dissolved_cache_path("2022", "PROV", "100-1800000000")
+            assert base != _dissolved_cache_path("2022", "DEPTO", "100-1700000000")
+            assert base != _dissolved_cache_path("2010", "PROV", "100-1700000000")
+
+        assert base.parent == temp_cache_dir / "dissolved"
+        assert base.suffix == ".parquet"
+
+    @pytest.mark.usefixtures("empty_lookup_memo")
+    def test_remote_file_version_from_metadata(self, tmp_path):
+        """La versión sale del tamaño y la fecha de modificación del archivo."""
+        import duckdb
+
+        from censo_argentino_qgis.query import remote_file_version
+
+        con = duckdb.connect()
+        source = tmp_path / "radios.parquet"
+        source.write_bytes(b"1234")
+        try:
+            version = remote_file_version(con, str(source))
+            assert version == f"4-{int(source.stat().st_mtime)}"
+            assert remote_file_version(con, str(tmp_path / "missing.parquet")) is None
+        finally:
+            con.close()
+
+    @pytest.mark.usefixtures("empty_lookup_memo")
+    def test_remote_file_version_queried_once_per_session(self):
+        """Las cargas siguientes reusan la versión sin otro pedido HTTP."""
+        from censo_argentino_qgis.query import remote_file_version
+
+        con = MagicMock()
+        con.execute.return_value.fetchone.return_value = (100, 1700000000)
+
+        assert remote_file_version(con, "https://example.org/radios.parquet") == "100-1700000000"
+        assert remote_file_version(con, "https://example.org/radios.parquet") == "100-1700000000"
+        con.execute.assert_called_once()
+
+    def test_existing_file_skips_dissolve(self, temp_cache_dir):
+        """Con el archivo ya en caché no se vuelve a consultar el parquet remoto."""
+        from censo_argentino_qgis.query import _ensure_dissolved_cache
+
+        cache_path = temp_cache_dir / "dissolved" / "2022_PROV_abc.parquet"
+        cache_path.parent.mkdir()
+        cache_path.write_bytes(b"")
+        con = MagicMock()
+
+        assert (
+            _ensure_dissolved_cache(con, cache_path, "radios.parquet", "geometry", {}) == cache_path
+        )
+        con.execute.assert_not_called()
+
+    def test_write_failure_falls_back_to_inline_dissolve(self, temp_cache_dir):
+        """Si no se puede escribir el disuelto, la carga sigue sin caché."""
+        import duckdb
+
+        from censo_argentino_qgis.query import _ensure_dissolved_cache
+
+        cache_path = temp_cache_dir / "dissolved" / "2022_PROV_abc.parquet"
+        con = duckdb.connect()
+        level = {"id_field": "g.PROV", "radio_cols": "PROV", "group_cols": "g.PROV"}
+
+        # Sin la extensión spatial (ni el archivo) la COPY falla
+        assert (
+            _ensure_dissolved_cache(con, cache_path, "missing.parquet", "geometry", level) is None
+        )
+        assert not cache_path.exists()
+        assert list(cache_path.parent.iterdir()) == []
+
+    def test_new_version_replaces_previous_files(self, temp_cache_dir):
+        """Al escribir una versión nueva se borran las viejas del mismo año y nivel."""
+        from censo_argentino_qgis.query import _ensure_dissolved_cache
+
+        dissolved_dir = temp_cache_dir / "dissolved"
+        dissolved_dir.mkdir()
+        stale = dissolved_dir / "2022_PROV_100-1700000000.parquet"
+        other_level = dissolved_dir / "2022_DEPTO_100-1700000000.parquet"
+        stale.write_bytes(b"")
+        other_level.write_bytes(b"")
+        cache_path = dissolved_dir / "2022_PROV_120-1800000000.parquet"
+
+        def write_copy_target(sql, *args):
+            # Simular la COPY creando el archivo temporal de destino
+            target = sql.split(") TO '", 1)[1].split("'", 1)[0]
+            Path(target).write_bytes(b"PAR1")
+
+        con = MagicMock()
+        con.execute.side_effect = write_copy_target
+        level = {"id_field": "g.PROV", "radio_cols": "PROV", "group_cols": "g.PROV"}
+
+        assert (
+            _ensure_dissolved_cache(con, cache_path, "radios.parquet", "geometry", level)
+            == cache_path
+        )
+        assert cache_path.read_bytes() == b"PAR1"
+        assert not stale.exists()
+        assert other_level.exists()
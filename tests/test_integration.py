@@ -14,7 +14,13 @@ import pytest
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from censo_argentino_qgis.query import get_variable_categories, preload_all_metadata
+from censo_argentino_qgis.query import (
+    check_cancelled,
+    field_type_for_duckdb_type,
+    find_geometry_column,
+    get_variable_categories,
+    preload_all_metadata,
+)
 from censo_argentino_qgis.query_builders import (
     build_geo_filter,
     build_pivot_columns,
@@ -94,7 +100,7 @@ class TestCategoryFiltering:
             }
         }
 
-        result = build_pivot_columns(["PERSONA_P11"], filtered_map)
+        result, _params = build_pivot_columns(["PERSONA_P11"], filtered_map)
 
         # Should have columns for selected categories + total
         assert 'as "persona_p11_si"' in result
@@ -108,7 +114,7 @@ class TestCategoryFiltering:
         """Should always include _total column even with filtered categories."""
         variable_categories_map = {"VAR1": {"categories": [("1", "Cat 1")], "has_nulls": False}}
 
-        result = build_pivot_columns(["VAR1"], variable_categories_map)
+        result, _params = build_pivot_columns(["VAR1"], variable_categories_map)
 
         # Should have both the category and total
         assert result.count("SUM(CASE") == 2
@@ -125,12 +131,11 @@ class TestCartesianProductFix:
             "PERSONA_P11": {"categories": [("1", "Sí"), ("2", "No")], "has_nulls": False}
         }
 
-        result = build_pivot_columns(["PERSONA_P11"], variable_categories_map)
+        result, params = build_pivot_columns(["PERSONA_P11"], variable_categories_map)
 
         # Should have CASE statements that filter by both variable AND category
-        assert "codigo_variable = 'PERSONA_P11'" in result
-        assert "valor_categoria = '1'" in result
-        assert "valor_categoria = '2'" in result
+        assert "codigo_variable = ? AND valor_categoria = ?" in result
+        assert params[:4] == ["PERSONA_P11", "1", "PERSONA_P11", "2"]
         assert "THEN conteo ELSE 0 END" in result
 
     def test_total_column_sums_all_categories(self):
@@ -139,11 +144,12 @@ class TestCartesianProductFix:
             "VAR1": {"categories": [("1", "A"), ("2", "B")], "has_nulls": False}
         }
 
-        result = build_pivot_columns(["VAR1"], variable_categories_map)
+        result, params = build_pivot_columns(["VAR1"], variable_categories_map)
 
         # Total column should only check variable, not category
-        # Look for pattern: "codigo_variable = 'VAR1' THEN conteo"
-        assert "codigo_variable = 'VAR1' THEN conteo" in result
+        # Look for pattern: "codigo_variable = ? THEN conteo"
+        assert "codigo_variable = ? THEN conteo" in result
+        assert params[-1] == "VAR1"
         assert 'as "var1_total"' in result
 
     def test_multiple_variables_independent_case_statements(self):
@@ -153,14 +159,13 @@ class TestCartesianProductFix:
             "VAR2": {"categories": [("1", "X")], "has_nulls": False},
         }
 
-        result = build_pivot_columns(["VAR1", "VAR2"], variable_categories_map)
+        result, params = build_pivot_columns(["VAR1", "VAR2"], variable_categories_map)
 
         # Should have separate CASE statements for each variable
-        assert "codigo_variable = 'VAR1'" in result
-        assert "codigo_variable = 'VAR2'" in result
+        assert result.count("SUM(CASE WHEN codigo_variable = ?") == 4
         # Should not mix variables in same CASE statement
-        var1_cases = result.count("codigo_variable = 'VAR1'")
-        var2_cases = result.count("codigo_variable = 'VAR2'")
+        var1_cases = params.count("VAR1")
+        var2_cases = params.count("VAR2")
         # Each variable should have: category column + total column
         assert var1_cases == 2  # 1 category + 1 total
         assert var2_cases == 2  # 1 category + 1 total
@@ -178,20 +183,85 @@ class TestQueryBuilders:
         assert "prov_code IN (?, ?)" in census_filter
         assert census_params == [2, 6]
 
-    def test_build_spatial_filter_creates_polygon(self):
-        """Should create proper ST_Intersects with POLYGON."""
+    def test_build_spatial_filter_creates_envelope(self):
+        """Should create proper ST_Intersects with a parameterized envelope."""
         bbox = (-58.5, -34.7, -58.3, -34.5)
-        result = build_spatial_filter(bbox)
+        sql, params = build_spatial_filter(bbox)
 
-        assert "ST_Intersects" in result
-        assert "POLYGON" in result
-        assert "-58.5 -34.7" in result
-        assert "-58.3 -34.5" in result
+        assert "ST_Intersects" in sql
+        assert "ST_MakeEnvelope(?, ?, ?, ?)" in sql
+        assert params == [-58.5, -34.7, -58.3, -34.5] * 2
 
     def test_build_spatial_filter_returns_empty_for_none(self):
-        """Should return empty string when no bbox provided."""
+        """Should return empty filter when no bbox provided."""
         result = build_spatial_filter(None)
-        assert result == ""
+        assert result == ("", [])
+
+
+class TestGeometryColumnDetection:
+    """Test geometry column detection for custom SQL results."""
+
+    @staticmethod
+    def describe(sql):
+        import duckdb
+
+        return duckdb.connect().execute(sql).description
+
+    def test_wkt_column_is_text_geometry(self):
+        """A column named wkt should be read as WKT."""
+        description = self.describe("SELECT 1 AS id, 'POINT (1 2)' AS wkt")
+        assert find_geometry_column(description) == (1, False)
+
+    def test_blob_geometry_column_is_wkb(self):
+        """A BLOB column named wkb/geom/geometry should be read as WKB."""
+        for name in ("wkb", "geom", "GEOMETRY"):
+            description = self.describe(f"SELECT 'x'::BLOB AS {name}, 1 AS id")
+            assert find_geometry_column(description) == (0, True)
+
+    def test_wkt_takes_precedence_over_wkb(self):
+        """When both are present, the wkt column wins (backward compatible)."""
+        description = self.describe("SELECT 'x'::BLOB AS wkb, 'POINT (1 2)' AS wkt")
+        assert find_geometry_column(description) == (1, False)
+
+    def test_non_blob_geometry_name_is_not_geometry(self):
+        """A text column named geometry is not treated as WKB."""
+        description = self.describe("SELECT 'abc' AS geometry, 1 AS id")
+        assert find_geometry_column(description) == (None, False)
+
+
+class TestCustomQueryFieldTypes:
+    """Test layer field types for custom SQL results."""
+
+    def test_types_come_from_schema_not_values(self):
+        """A numeric column whose first rows are NULL keeps its numeric type."""
+        import duckdb
+
+        from censo_argentino_qgis.query import QVariant
+
+        description = (
+            duckdb.connect()
+            .execute(
+                "SELECT NULL::BIGINT AS n, NULL::DOUBLE AS x, 'a' AS s, 1.5::DECIMAL(4, 1) AS d"
+            )
+            .description
+        )
+        types = [field_type_for_duckdb_type(d[1]) for d in description]
+
+        assert types == [QVariant.LongLong, QVariant.Double, QVariant.String, QVariant.String]
+
+
+class TestLoadCancellation:
+    """Test the cancellation check used between result batches."""
+
+    def test_no_callable_never_cancels(self):
+        """Without a cancellation callable the load always continues."""
+        check_cancelled(None)
+        check_cancelled(lambda: False)
+
+    def test_cancelled_load_raises(self):
+        """A cancelled load stops with an exception instead of building the layer."""
+        with pytest.raises(Exception, match="Carga cancelada"):
+            check_cancelled(lambda: True)
 
 
 class TestColumnCounting:
@@ -204,7 +274,7 @@ class TestColumnCounting:
         }
 
         # Expected: 2 categories + 1 total = 3 columns
-        result = build_pivot_columns(["VAR1"], variable_categories_map)
+        result, _params = build_pivot_columns(["VAR1"], variable_categories_map)
         assert result.count("SUM(CASE") == 3
 
     def test_counts_null_column_when_present(self):
@@ -212,7 +282,7 @@ class TestColumnCounting:
         variable_categories_map = {"VAR1": {"categories": [("1", "A")], "has_nulls": True}}
 
         # Expected: 1 category + 1 null + 1 total = 3 columns
-        result = build_pivot_columns(["VAR1"], variable_categories_map)
+        result, _params = build_pivot_columns(["VAR1"], variable_categories_map)
         assert result.count("SUM(CASE") == 3
         assert 'as "var1_null"' in result
 
@@ -220,7 +290,7 @@ class TestColumnCounting:
         """Should create single total column for variables without categories."""
         variable_categories_map = {"POB_TOT": {"categories": [], "has_nulls": False}}
 
-        result = build_pivot_columns(["POB_TOT"], variable_categories_map)
+        result, _params = build_pivot_columns(["POB_TOT"], variable_categories_map)
 
         # Expected: 1 total column only
         assert result.count("SUM(CASE") == 1
@@ -234,7 +304,7 @@ class TestNullHandling:
         """Should generate NULL column when has_nulls=True."""
         variable_categories_map = {"VAR1": {"categories": [("1", "Cat")], "has_nulls": True}}
 
-        result = build_pivot_columns(["VAR1"], variable_categories_map)
+        result, _params = build_pivot_columns(["VAR1"], variable_categories_map)
 
         assert "valor_categoria IS NULL" in result
         assert 'as "var1_null"' in result
@@ -243,7 +313,7 @@ class TestNullHandling:
         """Should not generate NULL column when has_nulls=False."""
         variable_categories_map = {"VAR1": {"categories": [("1", "Cat")], "has_nulls": False}}
 
-        result = build_pivot_columns(["VAR1"], variable_categories_map)
+        result, _params = build_pivot_columns(["VAR1"], variable_categories_map)
 
         assert "IS NULL" not in result
         assert "_null" not in result
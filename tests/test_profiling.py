@@ -10,8 +10,13 @@ Para benchmarks locales detallados (requiere conexión a internet):
     .venv/bin/pytest tests/test_profiling.py -v -s --run-benchmarks
 """
 
+from unittest.mock import MagicMock, patch
+
+import pytest
+
 from censo_argentino_qgis.query import (
     DUCKDB_MEMORY_LIMIT,
+    DUCKDB_THREADS,
     MAX_COLUMNS,
     DuckDBConnectionPool,
 )
@@ -46,21 +51,47 @@ class TestSpatialFilterPushdown:
     def test_spatial_filter_builds_valid_sql(self):
         """build_spatial_filter debe generar SQL válido."""
         bbox = (-60.8, -34.0, -60.3, -33.5)
-        sql = build_spatial_filter(bbox)
+        sql, params = build_spatial_filter(bbox)
 
         assert "ST_Intersects" in sql
-        assert "ST_GeomFromText" in sql
-        assert "POLYGON" in sql
-        # Verificar coordenadas
-        assert "-60.8" in sql
-        assert "-34.0" in sql
-        assert "-60.3" in sql
-        assert "-33.5" in sql
+        assert "ST_MakeEnvelope(?, ?, ?, ?)" in sql
+        # Verificar coordenadas (como parámetros, en orden xmin, ymin, xmax, ymax)
+        assert params == [-60.8, -34.0, -60.3, -33.5] * 2
 
     def test_spatial_filter_empty_for_none_bbox(self):
         """Sin bbox, no debe haber filtro espacial."""
-        sql = build_spatial_filter(None)
+        sql, params = build_spatial_filter(None)
         assert sql == ""
+        assert params == []
+
+
+@pytest.fixture
+def restore_pool():
+    """Guardar el estado del singleton DuckDBConnectionPool y restaurarlo al terminar."""
+    pool = DuckDBConnectionPool()
+    saved = (pool._connection, pool._extensions_loaded)
+    try:
+        yield pool
+    finally:
+        pool._connection, pool._extensions_loaded = saved
+
+
+@pytest.fixture
+def mock_connection(restore_pool, temp_cache_dir):
+    """Conexión simulada instalada en el singleton (y devuelta por duckdb.connect).
+
+    El caché del plugin apunta a un directorio temporal mientras dura el test.
+    """
+    mock_con = MagicMock()
+    restore_pool._connection, restore_pool._extensions_loaded = mock_con, False
+    with patch("censo_argentino_qgis.query.duckdb.connect", return_value=mock_con):
+        with patch("censo_argentino_qgis.query.get_cache_dir", return_value=temp_cache_dir):
+            yield mock_con
+
+
+def executed_sql(mock_con):
+    """Sentencias ejecutadas sobre una conexión simulada, en orden."""
+    return [c.args[0] for c in mock_con.execute.call_args_list]
 
 
 class TestConnectionPool:
@@ -72,6 +103,130 @@ class TestConnectionPool:
         pool2 = DuckDBConnectionPool()
         assert pool1 is pool2
 
+    def test_enables_http_caches_with_extensions(self, restore_pool, mock_connection):
+        """Al cargar extensiones debe activar los cachés HTTP/objetos de DuckDB."""
+        restore_pool.get_connection()
+
+        executed = executed_sql(mock_connection)
+        assert "SET enable_http_metadata_cache = true" in executed
+        assert "SET enable_object_cache = true" in executed
+        assert "SET http_keep_alive = true" in executed
+        assert "SET enable_external_file_cache = true" in executed
+        assert "SET parquet_metadata_cache = true" in executed
+
+    def test_skips_install_for_installed_extensions(self, restore_pool, mock_connection):
+        """Extensiones ya instaladas se cargan con LOAD sin volver a INSTALL."""
+        mock_connection.execute.return_value.fetchone.side_effect = [(True,), (False,), (True,)]
+
+        restore_pool.get_connection()
+
+        executed = executed_sql(mock_connection)
+        assert "INSTALL httpfs" not in executed
+        assert "LOAD httpfs" in executed
+        assert "INSTALL spatial" in executed
+        assert "LOAD spatial" in executed
+
+    def test_disk_http_cache_is_optional(self, restore_pool, mock_connection):
+        """Si cache_httpfs no se puede instalar, la conexión sigue con los cachés en memoria."""
+        import duckdb
+
+        def execute(sql, *args):
+            if "cache_httpfs" in sql and sql.startswith(("INSTALL", "LOAD")):
+                raise duckdb.IOException("sin red")
+            result = MagicMock()
+            result.fetchone.return_value = (False,)
+            return result
+
+        mock_connection.execute.side_effect = execute
+
+        assert restore_pool.get_connection() is mock_connection
+        assert restore_pool._extensions_loaded
+
+        executed = executed_sql(mock_connection)
+        assert "INSTALL cache_httpfs FROM community" in executed
+        assert "SET parquet_metadata_cache = true" in executed
+        assert not any(sql.startswith("SET cache_httpfs") for sql in executed)
+
+    def test_new_connection_sets_threads_and_temp_directory(
+        self, restore_pool, mock_connection, temp_cache_dir
+    ):
+        """La conexión nueva debe limitar hilos y derramar dentro del caché del plugin."""
+        restore_pool._connection = None
+
+        restore_pool.get_connection(load_extensions=False)
+
+        executed = executed_sql(mock_connection)
+        assert f"SET threads = {DUCKDB_THREADS}" in executed
+        assert f"SET temp_directory = '{(temp_cache_dir / 'duckdb_tmp').as_posix()}'" in executed
+        assert DUCKDB_THREADS >= 1
+
+    def test_temp_directory_with_apostrophe(self, restore_pool, temp_cache_dir):
+        """Un directorio personal con apóstrofo no debe romper la configuración."""
+        cache_dir = temp_cache_dir / "o'neil"
+        restore_pool._connection = None
+
+        with patch("censo_argentino_qgis.query.get_cache_dir", return_value=cache_dir):
+            con = restore_pool.get_connection(load_extensions=False)
+        try:
+            setting = con.execute("SELECT current_setting('temp_directory')").fetchone()[0]
+            assert setting == (cache_dir / "duckdb_tmp").as_posix()
+        finally:
+            con.close()
+
+    def test_failed_setup_does_not_publish_connection(self, restore_pool, mock_connection):
+        """Si la configuración inicial falla, no queda una conexión a medio configurar."""
+        mock_connection.execute.side_effect = RuntimeError("falla")
+        restore_pool._connection = None
+
+        with pytest.raises(RuntimeError):
+            restore_pool.get_connection(load_extensions=False)
+
+        assert restore_pool._connection is None
+        mock_connection.close.assert_called_once()
+
+    def test_cursor_shares_connection(self):
+        """Los cursores deben salir de la conexión compartida, sin reconectar."""
+        pool = DuckDBConnectionPool()
+        con = pool.get_connection(load_extensions=False)
+        cur1 = pool.cursor(load_extensions=False)
+        cur2 = pool.cursor(load_extensions=False)
+        try:
+            assert cur1 is not cur2
+            assert pool.get_connection(load_extensions=False) is con
+            assert cur1.execute("SELECT 42").fetchone() == (42,)
+        finally:
+            cur1.close()
+            cur2.close()
+
+    def test_interrupt_stops_running_cursor_query(self):
+        """interrupt() corta la consulta en curso de un cursor usado desde otro hilo."""
+        import threading
+
+        import duckdb
+
+        pool = DuckDBConnectionPool()
+        cur = pool.cursor(load_extensions=False)
+        errors = []
+
+        def run():
+            try:
+                cur.execute("SELECT count(*) FROM range(1000000000000) a").fetchone()
+            except duckdb.InterruptException as e:
+                errors.append(e)
+
+        worker = threading.Thread(target=run)
+        worker.start()
+        try:
+            # Reintentar hasta que la consulta esté corriendo y se interrumpa
+            while worker.is_alive():
+                pool.interrupt()
+                worker.join(timeout=0.05)
+            assert len(errors) == 1
+        finally:
+            cur.close()
+
+        pool.interrupt()  # Cursores ya cerrados no fallan
+
 
 class TestColumnLimitEnforcement:
     """Tests para verificar que el límite de columnas se respeta."""
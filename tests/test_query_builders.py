@@ -8,6 +8,8 @@ from censo_argentino_qgis.query_builders import (
     build_geo_filter,
     build_pivot_columns,
     build_spatial_filter,
+    extract_pivot_column_names,
+    quote_identifier,
 )
 
 
@@ -166,59 +168,61 @@ class TestBuildSpatialFilter:
     """Tests for build_spatial_filter function."""
 
     def test_returns_empty_when_bbox_none(self):
-        """Should return empty string when bbox is None."""
+        """Should return empty filter and no params when bbox is None."""
         result = build_spatial_filter(None)
-        assert result == ""
+        assert result == ("", [])
 
     def test_builds_valid_spatial_filter(self):
-        """Should build ST_Intersects filter with POLYGON."""
+        """Should build ST_Intersects filter against a parameterized envelope."""
         bbox = (-58.5, -34.7, -58.3, -34.5)
-        result = build_spatial_filter(bbox)
+        sql, params = build_spatial_filter(bbox)
 
-        assert "ST_Intersects" in result
-        assert "ST_GeomFromText" in result
-        assert "POLYGON" in result
-        # DuckDB doesn't support SRID parameter, so no 4326 in output
+        assert "ST_Intersects" in sql
+        assert "ST_MakeEnvelope(?, ?, ?, ?)" in sql
+        assert len(params) == sql.count("?")
 
     def test_uses_custom_geometry_column(self):
         """Should use custom geometry column name."""
         bbox = (-58.5, -34.7, -58.3, -34.5)
-        result = build_spatial_filter(bbox, geometry_column="geom")
+        sql, _params = build_spatial_filter(bbox, geometry_column="geom")
 
-        assert "ST_Intersects(geom," in result
+        assert "ST_Intersects(geom," in sql
 
     def test_uses_correct_bbox_coordinates(self):
-        """Should use bbox coordinates in correct order for POLYGON."""
+        """Should pass bbox coordinates in (xmin, ymin, xmax, ymax) order."""
         bbox = (-58.5, -34.7, -58.3, -34.5)
-        result = build_spatial_filter(bbox)
+        _sql, params = build_spatial_filter(bbox)
 
-        # Check all four corners are present
-        assert "-58.5 -34.7" in result  # min x, min y
-        assert "-58.3 -34.7" in result  # max x, min y
-        assert "-58.3 -34.5" in result  # max x, max y
-        assert "-58.5 -34.5" in result  # min x, max y
+        assert params == [-58.5, -34.7, -58.3, -34.5] * 2
 
-    def test_closes_polygon(self):
-        """Should close POLYGON by repeating first coordinate."""
+    def test_extent_prefilter_precedes_exact_predicate(self):
+        """The cheap bbox-only check must run before the exact ST_Intersects."""
         bbox = (-58.5, -34.7, -58.3, -34.5)
-        result = build_spatial_filter(bbox)
+        sql, _params = build_spatial_filter(bbox)
 
-        # First and last coordinates should be the same
-        assert result.count("-58.5 -34.7") == 2  # Appears at start and end
+        assert "ST_Intersects_Extent(geometry," in sql
+        assert sql.index("ST_Intersects_Extent") < sql.index("ST_Intersects(geometry,")
+
+    def test_coordinates_not_interpolated(self):
+        """Coordinates must travel as parameters, never inside the SQL text."""
+        bbox = (-58.5, -34.7, -58.3, -34.5)
+        sql, _params = build_spatial_filter(bbox)
+
+        assert "-58.5" not in sql
+        assert "POLYGON" not in sql
 
     def test_handles_various_coordinate_ranges(self):
         """Should work with different coordinate systems."""
         # Test with positive coordinates
         bbox = (10.0, 20.0, 15.0, 25.0)
-        result = build_spatial_filter(bbox)
-        assert "10.0 20.0" in result
-        assert "15.0 25.0" in result
+        _sql, params = build_spatial_filter(bbox)
+        assert params == [10.0, 20.0, 15.0, 25.0] * 2
 
-        # Test with large negative coordinates
+        # Test with large negative integer coordinates (converted to float)
         bbox = (-180, -90, 180, 90)
-        result = build_spatial_filter(bbox)
-        assert "-180 -90" in result
-        assert "180 90" in result
+        _sql, params = build_spatial_filter(bbox)
+        assert params == [-180.0, -90.0, 180.0, 90.0] * 2
+        assert all(isinstance(p, float) for p in params)
 
 
 class TestBuildPivotColumns:
@@ -233,12 +237,11 @@ class TestBuildPivotColumns:
             }
         }
 
-        result = build_pivot_columns(["PERSONA_P11"], variable_categories_map)
+        result, params = build_pivot_columns(["PERSONA_P11"], variable_categories_map)
 
-        # Check both categories present
-        assert "codigo_variable = 'PERSONA_P11'" in result
-        assert "valor_categoria = '1'" in result
-        assert "valor_categoria = '2'" in result
+        # Check both categories present (code and value travel as parameters)
+        assert "codigo_variable = ? AND valor_categoria = ?" in result
+        assert params == ["PERSONA_P11", "1", "PERSONA_P11", "2", "PERSONA_P11"]
         assert 'as "persona_p11_si"' in result
         assert 'as "persona_p11_no"' in result
 
@@ -252,7 +255,9 @@ class TestBuildPivotColumns:
             },
         }
 
-        result = build_pivot_columns(["PERSONA_P11", "PERSONA_P19"], variable_categories_map)
+        result, _params = build_pivot_columns(
+            ["PERSONA_P11", "PERSONA_P19"], variable_categories_map
+        )
 
         # Should have 7 total columns (2 + 1 total + 3 + 1 total)
         assert result.count("SUM(CASE") == 7
@@ -273,7 +278,7 @@ class TestBuildPivotColumns:
             }
         }
 
-        result = build_pivot_columns(["TEST"], variable_categories_map)
+        result, _params = build_pivot_columns(["TEST"], variable_categories_map)
 
         # Check sanitization
         assert "test_categoria_con_n" in result  # removed accent and ñ
@@ -283,11 +288,11 @@ class TestBuildPivotColumns:
         """Should add NULL category column if has_nulls is True."""
         variable_categories_map = {"VAR1": {"categories": [("1", "Category 1")], "has_nulls": True}}
 
-        result = build_pivot_columns(["VAR1"], variable_categories_map)
+        result, params = build_pivot_columns(["VAR1"], variable_categories_map)
 
         # Should have 3 columns: one for category, one for NULLs, one for total
         assert result.count("SUM(CASE") == 3
-        assert "valor_categoria = '1'" in result
+        assert params == ["VAR1", "1", "VAR1", "VAR1"]
         assert "valor_categoria IS NULL" in result
         assert 'as "var1_null"' in result
         assert 'as "var1_total"' in result
@@ -298,7 +303,7 @@ class TestBuildPivotColumns:
             "VAR1": {"categories": [("1", "Category 1")], "has_nulls": False}
         }
 
-        result = build_pivot_columns(["VAR1"], variable_categories_map)
+        result, _params = build_pivot_columns(["VAR1"], variable_categories_map)
 
         # Should have 2 columns: one for category, one for total
         assert result.count("SUM(CASE") == 2
@@ -309,7 +314,7 @@ class TestBuildPivotColumns:
         """Should create single total column for variables without categories."""
         variable_categories_map = {"POB_TOT": {"categories": [], "has_nulls": False}}
 
-        result = build_pivot_columns(["POB_TOT"], variable_categories_map)
+        result, _params = build_pivot_columns(["POB_TOT"], variable_categories_map)
 
         # Should create total column
         assert 'as "pob_tot_total"' in result
@@ -317,9 +322,8 @@ class TestBuildPivotColumns:
         assert result.count("SUM(CASE") == 1
 
     def test_handles_empty_variable_list(self):
-        """Should return empty string for empty variable list."""
-        result = build_pivot_columns([], {})
-        assert result == ""
+        """Should return empty SQL and no params for empty variable list."""
+        assert build_pivot_columns([], {}) == ("", [])
 
     def test_uses_full_length_names(self):
         """Should NOT truncate to 10 characters (shapefile compatibility removed)."""
@@ -330,7 +334,7 @@ class TestBuildPivotColumns:
             }
         }
 
-        result = build_pivot_columns(["TEST"], variable_categories_map)
+        result, _params = build_pivot_columns(["TEST"], variable_categories_map)
 
         # Should have full name, not truncated
         assert "very_long_category_name_that_exceeds_ten" in result
@@ -341,7 +345,7 @@ class TestBuildPivotColumns:
             "VAR1": {"categories": [("1", "Cat 1"), ("2", "Cat 2")], "has_nulls": False}
         }
 
-        result = build_pivot_columns(["VAR1"], variable_categories_map)
+        result, _params = build_pivot_columns(["VAR1"], variable_categories_map)
 
         # Should use newline + spaces for formatting
         assert ",\n        " in result
@@ -353,7 +357,7 @@ class TestBuildPivotColumns:
             "VAR_123": {"categories": [("1", "Yes")], "has_nulls": False},
         }
 
-        result = build_pivot_columns(["POB_2022_TOT", "VAR_123"], variable_categories_map)
+        result, _params = build_pivot_columns(["POB_2022_TOT", "VAR_123"], variable_categories_map)
 
         # Should have columns for both variables
         assert "pob_2022_tot_male" in result
@@ -366,7 +370,7 @@ class TestBuildPivotColumns:
             "PERSONA_P11": {"categories": [("1", "Sí"), ("2", "No")], "has_nulls": False}
         }
 
-        result = build_pivot_columns(["PERSONA_P11"], variable_categories_map)
+        result, _params = build_pivot_columns(["PERSONA_P11"], variable_categories_map)
 
         # Should have 3 columns: si, no, and total
         assert result.count("SUM(CASE") == 3
@@ -375,4 +379,46 @@ class TestBuildPivotColumns:
         assert 'as "persona_p11_total"' in result
 
         # Total column should sum all categories (no valor_categoria filter)
-        assert "codigo_variable = 'PERSONA_P11' THEN conteo" in result
+        assert "codigo_variable = ? THEN conteo" in result
+
+    def test_no_catalog_values_interpolated(self):
+        """Quotes in category values must not reach the SQL text."""
+        variable_categories_map = {
+            "VAR1": {"categories": [("1' OR '1'='1", "A")], "has_nulls": False}
+        }
+
+        result, params = build_pivot_columns(["VAR1"], variable_categories_map)
+
+        assert "'" not in result
+        assert result.count("?") == len(params)
+        assert params == ["VAR1", "1' OR '1'='1", "VAR1"]
+
+    def test_quoted_variable_code_stays_inside_alias(self):
+        """A double quote in a variable code must not close the column alias."""
+        import duckdb
+
+        var_code = 'VAR"X'
+        variable_categories_map = {var_code: {"categories": [("1", "A")], "has_nulls": False}}
+
+        result, params = build_pivot_columns([var_code], variable_categories_map)
+
+        con = duckdb.connect()
+        con.execute(
+            "CREATE TABLE t AS SELECT ? AS codigo_variable, '1' AS valor_categoria, 5 AS conteo",
+            [var_code],
+        )
+        description = con.execute(f"SELECT {result} FROM t", params).description  # nosec B608
+        assert [d[0] for d in description] == ['var"x_a', 'var"x_total']
+        assert extract_pivot_column_names(result) == ['var"x_a', 'var"x_total']
+
+
+class TestQuoteIdentifier:
+    """Tests for quote_identifier function."""
+
+    def test_wraps_in_double_quotes(self):
+        """Plain names are wrapped in double quotes."""
+        assert quote_identifier("var1_total") == '"var1_total"'
+
+    def test_escapes_inner_double_quotes(self):
+        """Inner double quotes are doubled (SQL standard escaping)."""
+        assert quote_identifier('a"b') == '"a""b"'
@@ -0,0 +1,56 @@
+"""Tests para el índice de trigramas usado en la búsqueda de variables."""
+
+from censo_argentino_qgis.search_index import build_trigram_index, search_trigram_index
+
+TEXTS = [
+    "población total (pob_tot_p)",
+    "total de viviendas (vivienda_tot)",
+    "total de hogares (hogar_tot)",
+    "nivel educativo (persona_p11)",
+]
+
+
+class TestBuildTrigramIndex:
+    """Tests para build_trigram_index."""
+
+    def test_indexes_every_trigram(self):
+        """Cada trigrama de cada texto debe apuntar a su fila."""
+        index = build_trigram_index(["abcd"])
+        assert index == {"abc": {0}, "bcd": {0}}
+
+    def test_shared_trigrams_map_to_all_rows(self):
+        """Trigramas compartidos deben listar todas las filas que los contienen."""
+        index = build_trigram_index(TEXTS)
+        assert index["tot"] == {0, 1, 2}
+
+    def test_short_texts_are_not_indexed(self):
+        """Textos de menos de 3 caracteres no generan trigramas."""
+        assert build_trigram_index(["ab", ""]) == {}
+
+
+class TestSearchTrigramIndex:
+    """Tests para search_trigram_index."""
+
+    def test_matches_linear_substring_search(self):
+        """Debe devolver exactamente las filas que una búsqueda lineal encontraría."""
+        index = build_trigram_index(TEXTS)
+        for query in ["total", "de ", "tot)", "vivienda", "p11", "xyz"]:
+            expected = {i for i, text in enumerate(TEXTS) if query in text}
+            assert search_trigram_index(index, TEXTS, query) == expected
+
+    def test_query_is_case_insensitive(self):
+        """La búsqueda se normaliza a minúsculas."""
+        index = build_trigram_index(TEXTS)
+        assert search_trigram_index(index, TEXTS, "HOGARES") == {2}
+
+    def test_short_query_returns_none(self):
+        """Búsquedas de menos de 3 caracteres delegan en la búsqueda lineal."""
+        index = build_trigram_index(TEXTS)
+        assert search_trigram_index(index, TEXTS, "to") is None
+        assert search_trigram_index(index, TEXTS, "") is None
+
+    def test_rejects_non_contiguous_trigrams(self):
+        """Trigramas presentes pero no contiguos no deben contar como coincidencia."""
+        texts = ["abcxbcd"]
+        index = build_trigram_index(texts)
+        assert search_trigram_index(index, texts, "abcd") == set()
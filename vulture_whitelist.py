@@ -19,7 +19,7 @@ _.iface  # Interfaz principal de QGIS pasada al plugin
 _.run  # Ejecutado cuando el usuario hace clic en el botón del plugin
 
 # === PyQt Signals ===
-_.finished  # QThread.finished signal
+_.finished  # DataLoaderSignals.finished signal
 _.progress  # Señal de progreso personalizada
 
 # === Test Fixtures ===
@@ -28,6 +28,7 @@ _.sample_variables  # conftest.py fixture
 _.sample_geo_codes  # conftest.py fixture
 _.duckdb_connection  # test_benchmarks.py fixture
 _.census_urls  # test_benchmarks.py fixture
+_.empty_lookup_memo  # test_cache.py fixture
 
 # === pytest hooks ===
 _.pytest_addoption  # conftest.py - agrega opciones CLI